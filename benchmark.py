@@ -0,0 +1,275 @@
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+
+# Times the hot paths of every maze version: dungeon generation against grid size, one
+# step of movement, one round of battle and (for 3.0) whole headless runs. Each result is
+# the best seconds-per-operation over several batches. Results can be written as JSON and
+# compared against an earlier file to catch regressions.
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def load(version):
+    # The game scripts have dots in their names, so they are loaded from their paths.
+    if HERE not in sys.path:
+        sys.path.insert(0, HERE)  # for spatial_index
+    spec = importlib.util.spec_from_file_location(f"maze{version.replace('.', '_')}", os.path.join(HERE, f"maze{version}.py"))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module  # so pickle can find the game's classes
+    spec.loader.exec_module(module)
+    return module
+
+def quiet(*args, **kwargs):
+    pass
+
+def answering(*answers):
+    # Stands in for input() in the older versions, which read and print directly:
+    # gives the answers in turn, then keeps repeating the last one.
+    pending = list(reversed(answers))
+    def read(prompt=""):
+        return pending.pop() if len(pending) > 1 else pending[0]
+    return read
+
+def best_of(repeat, batch):
+    # batch() times one batch and returns (seconds, operations); the fastest batch wins.
+    best = None
+    for _ in range(repeat):
+        seconds, operations = batch()
+        if operations and (best is None or seconds / operations < best):
+            best = seconds / operations
+    return best
+
+# --- maze1.0 ---
+
+def maze1_benchmarks(m, folder):
+    m.print = quiet
+    m.input = answering("1")
+
+    def generate(size):
+        def batch():
+            random.seed(size)
+            start = time.perf_counter()
+            for _ in range(20):
+                m.Dungeon(size).generate()
+            return time.perf_counter() - start, 20
+        return batch
+
+    def move():
+        random.seed(1)
+        dungeon = m.Dungeon(100)
+        dungeon.player_location = dungeon.generate()
+        def batch():
+            dungeon.player_location = (0, 50)
+            start = time.perf_counter()
+            for direction in ("east", "west"):
+                for _ in range(99):
+                    dungeon.move_player(direction)
+            return time.perf_counter() - start, 198
+        return batch
+
+    def battle():
+        # 2000 attack rounds, then the player runs: Dungeon.battle breaks on a kill.
+        random.seed(1)
+        dungeon = m.Dungeon(6)
+        dungeon.generate()
+        def batch():
+            dungeon.player.health = 10 ** 9
+            enemy = m.Enemy("Enemy", 10 ** 9, 5, 10, 3)
+            m.input = answering(*["1"] * 2000, "2")
+            start = time.perf_counter()
+            dungeon.battle(enemy)
+            return time.perf_counter() - start, 2000
+        return batch
+
+    return {
+        **{f"maze1.generate.{size}x{size}": generate(size) for size in (6, 50, 200)},
+        "maze1.move.step": move(),
+        "maze1.battle.round": battle(),
+    }
+
+# --- maze2.0 ---
+
+def maze2_benchmarks(m, folder):
+    # 2.0 fights crash on attributes its Player and Enemy never had, and its play_game
+    # generates the floor inline, so only movement and the leaderboard are timed.
+    m.print = quiet
+
+    def move(size):
+        game = m.DungeonBase(size, size, leaderboard=m.Leaderboard(":memory:", None))
+        game.player = m.Player("Bench")
+        game.player.x, game.player.y = 0, size // 2
+        game.rooms[game.player.y][0] = game.player
+        game.renderer.invalidate()
+        game.print_map()
+        def batch():
+            start = time.perf_counter()
+            for direction in ("right", "left"):
+                for _ in range(size - 1):
+                    game.move_player(direction)
+                    game.print_map()
+            return time.perf_counter() - start, 2 * (size - 1)
+        return batch
+
+    def leaderboard():
+        board = m.Leaderboard(os.path.join(folder, "scores.db"), None)
+        scores = random.Random(2)
+        def batch():
+            start = time.perf_counter()
+            for i in range(200):
+                board.add(f"player{i}", scores.randint(0, 5000))
+            return time.perf_counter() - start, 200
+        return batch
+
+    return {
+        **{f"maze2.move.{size}x{size}": move(size) for size in (10, 100, 1000)},
+        "maze2.leaderboard.add": leaderboard(),
+    }
+
+# --- maze3.0 ---
+
+def maze3_benchmarks(m, folder):
+    class Attacker(m.Policy):
+        def __init__(self):
+            self.rounds = 0
+
+        def battle(self, game, enemy):
+            self.rounds += 1
+            return "1"
+
+    class Walker(m.Policy):
+        # Follows the corridor through the middle of every streaming chunk eastwards.
+        def action(self, game):
+            return "2" if game.rooms[game.player.y][game.player.x + 1] is not None else "7"
+
+    def generate(size):
+        game = m.DungeonBase(size, size, policy=m.Policy(), out=m.NullOutput(), seed=size)
+        def batch():
+            start = time.perf_counter()
+            for floor in range(1, 6):
+                game.generate_dungeon(floor)
+            return time.perf_counter() - start, 5
+        return batch
+
+    def move():
+        # A single open corridor, walked end to end; cleared cells cannot be walked twice.
+        width = 2000
+        def batch():
+            game = m.DungeonBase(width, 1, policy=m.Policy(), out=m.NullOutput(), seed=1)
+            game.rooms[0] = ["Empty"] * width
+            game.player = m.Player("Bench", game.out, game.rng.combat)
+            game.rooms[0][0] = game.player
+            start = time.perf_counter()
+            for _ in range(width - 1):
+                game.resolve(game.move_player("right"))
+            return time.perf_counter() - start, width - 1
+        return batch
+
+    def battle():
+        policy = Attacker()
+        game = m.DungeonBase(10, 10, policy=policy, out=m.NullOutput(), seed=1)
+        game.generate_dungeon(1)
+        def batch():
+            game.player.health = game.player.max_health = 10 ** 9
+            enemy = m.Enemy("Goblin", 10 ** 5, 5, 0, 10)
+            policy.rounds = 0
+            start = time.perf_counter()
+            game.resolve(game.battle(enemy))
+            return time.perf_counter() - start, policy.rounds
+        return batch
+
+    def stream():
+        # A streaming game walked across dozens of chunks, so chunks are evicted and spilled too.
+        def batch():
+            game = m.StreamingDungeon(policy=Walker(), out=m.NullOutput(), chunk_size=16, seed=1)
+            game.player = m.Player("Bench", game.out, game.rng.combat)
+            game.player.health = game.player.max_health = game.player.attack_power = 10 ** 6
+            start = time.perf_counter()
+            game.play_game(max_turns=1000)
+            return time.perf_counter() - start, game.turns
+        return batch
+
+    def full_runs():
+        seeds = iter(range(10 ** 9))
+        def batch():
+            start = time.perf_counter()
+            for _ in range(50):
+                seed = next(seeds)
+                m.simulate_run(m.GreedyPolicy(seed), record=False, seed=seed)
+            return time.perf_counter() - start, 50
+        return batch
+
+    return {
+        **{f"maze3.generate.{size}x{size}": generate(size) for size in (10, 50, 200)},
+        "maze3.move.step": move(),
+        "maze3.battle.round": battle(),
+        "maze3.stream.step": stream(),
+        "maze3.run.full": full_runs(),
+    }
+
+SUITES = {"1.0": maze1_benchmarks, "2.0": maze2_benchmarks, "3.0": maze3_benchmarks}
+
+# --- Results ---
+
+def run_benchmarks(versions, repeat=5, only=None):
+    # Each suite maps benchmark names to batches; folder is scratch space they may write to.
+    results = {}
+    with tempfile.TemporaryDirectory() as folder:
+        for version in versions:
+            for name, batch in SUITES[version](load(version), folder).items():
+                if only and only not in name:
+                    continue
+                results[name] = best_of(repeat, batch)
+    return results
+
+def compare(results, baseline, threshold):
+    # (name, new / old seconds, regressed) for every benchmark in both runs.
+    rows = []
+    for name, seconds in results.items():
+        old = baseline.get(name)
+        if old:
+            ratio = seconds / old
+            rows.append((name, ratio, ratio > 1 + threshold))
+    return rows
+
+def format_results(results, rows=()):
+    changes = {name: (ratio, regressed) for name, ratio, regressed in rows}
+    lines = [f"{'Benchmark':<26}{'per op':>12}{'ops/s':>12}{'vs baseline':>14}"]
+    for name, seconds in results.items():
+        line = f"{name:<26}{seconds * 1e6:>10.2f}us{1 / seconds:>12.0f}"
+        if name in changes:
+            ratio, regressed = changes[name]
+            line += f"{ratio - 1:>+13.1%}" + (" REGRESSION" if regressed else "")
+        lines.append(line)
+    return "\n".join(lines)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks for the maze games")
+    parser.add_argument("versions", nargs="*", default=list(SUITES), help="versions to time (default: all)")
+    parser.add_argument("--repeat", type=int, default=5, help="batches per benchmark; the fastest counts")
+    parser.add_argument("--only", metavar="TEXT", help="run only benchmarks whose name contains TEXT")
+    parser.add_argument("--output", metavar="PATH", help="write the results to PATH as JSON")
+    parser.add_argument("--baseline", metavar="PATH", help="compare against results written with --output")
+    parser.add_argument("--threshold", type=float, default=0.10, help="slowdown that counts as a regression")
+    args = parser.parse_args()
+    for version in args.versions:
+        if version not in SUITES:
+            parser.error(f"unknown version {version} (choose from {', '.join(SUITES)})")
+
+    results = run_benchmarks(args.versions, args.repeat, args.only)
+    rows = []
+    if args.baseline:
+        with open(args.baseline) as file:
+            rows = compare(results, json.load(file)["results"], args.threshold)
+    print(format_results(results, rows))
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump({"python": platform.python_version(), "machine": platform.machine(),
+                       "results": results}, file, indent=2)
+    if any(regressed for _, _, regressed in rows):
+        sys.exit(1)
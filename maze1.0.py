@@ -1,5 +1,7 @@
 import random
 
+from spatial_index import SpatialIndex
+
 # Define the player class
 class Player:
     def __init__(self, name):
@@ -103,8 +105,8 @@ class Dungeon:
         self.player = None
         self.player_location = None 
         self.exit_location = None
-        self.enemies = []
-        self.items = []
+        self.enemies = SpatialIndex()  # enemies by (x, y)
+        self.items = SpatialIndex()  # items by (x, y)
         self.shop = Shop()
         self.leaderboard = []
         self.moves = 0  # Track the number of moves
@@ -123,14 +125,14 @@ class Dungeon:
             enemy_level = self.player.level
             enemy = Enemy("Enemy", random.randint(10, 20) * enemy_level, random.randint(5, 10) * enemy_level, enemy_level * 10, random.randint(3, 4))
             enemy_location = (random.randint(0, self.size-1), random.randint(0, self.size-1))
-            self.enemies.append((enemy, enemy_location))
+            self.enemies.add(enemy, enemy_location)
 
         # Generate items
         num_items = random.randint(self.size, self.size*2)
         for _ in range(num_items):
             item = "Health Potion"
             item_location = (random.randint(0, self.size-1), random.randint(0, self.size-1))
-            self.items.append((item, item_location))
+            self.items.add(item, item_location)
 
         return player_location
 
@@ -207,12 +209,10 @@ class Dungeon:
                     print(player, "-", score)
                 break
 
-            # Print messages after encountering an enemy
-            defeated_enemies = []  # Track defeated enemies
-
-            for enemy, enemy_location in self.enemies:
-                if enemy_location == self.player_location:
-                    print("An enemy has appeared!")
+            # Only the enemies on the player's cell can be met this turn
+            for enemy in self.enemies.at(self.player_location):
+                enemy_location = self.player_location
+                print("An enemy has appeared!")
                 while enemy.is_alive() and self.player.is_alive():
                         print("Player HP:", self.player.health)
                         print("Enemy HP:", enemy.health)
@@ -232,14 +232,15 @@ class Dungeon:
                                 if self.player.xp >= self.player.level * 20:
                                     self.player.level_up()
                                     # Increase enemy power
-                                    for enemy, _ in self.enemies:
-                                        enemy.attack_power += 2
-                                        enemy.health += 10
+                                    for other, _ in self.enemies:
+                                        other.attack_power += 2
+                                        other.health += 10
                                 # Drop gold
                                 gold_drop = random.randint(3, 4)
                                 self.player.gold += gold_drop
                                 print(f"The enemy dropped {gold_drop} gold.")
-                                defeated_enemies.append((enemy, enemy_location))
+                                # Remove the defeated enemy from its cell
+                                self.enemies.remove(enemy, enemy_location)
                                 break
                         elif choice == "2":
                             print("You ran away from the enemy.")
@@ -248,33 +249,16 @@ class Dungeon:
                         else:
                             print("Invalid choice. Try again.")
 
-                        if not enemy.is_alive():
-                            print("You defeated the enemy.")
-                            self.player.collect_item("Gold")
-                            self.player.xp += 10
-                            if self.player.xp >= self.player.level * 20:
-                                self.player.level_up()
-                                # Increase enemy power
-                                for enemy, _ in self.enemies:
-                                    enemy.attack_power += 2
-                                    enemy.health += 10
-                            # Drop gold
-                            gold_drop = random.randint(3, 4)
-                            self.player.gold += gold_drop
-                            print(f"The enemy dropped {gold_drop} gold.")
-                            defeated_enemies.append((enemy, enemy_location))
-
-            # Remove defeated enemies from the enemies list
-            for enemy, enemy_location in defeated_enemies:
-                self.enemies = [(e, loc) for e, loc in self.enemies if loc != enemy_location]
-
-            for item, item_location in self.items:
-                if item_location == self.player_location:
-                    print("You found a", item)
-                    self.player.collect_item(item)
-                    self.items.remove((item, item_location))
+                # Running away or dying ends this cell's encounters; the rest stay put
+                if not self.player.is_alive() or self.player_location != enemy_location:
                     break
 
+            item = self.items.first(self.player_location)
+            if item is not None:
+                print("You found a", item)
+                self.player.collect_item(item)
+                self.items.remove(item, self.player_location)
+
             if self.player_location == (self.size-1, self.size-1):
                 self.shop.display_items()
                 while True:
@@ -308,8 +292,9 @@ class Dungeon:
             self.moves += 1  # Increment moves count
 
 # Run the game
-dungeon = Dungeon(6)
-dungeon.run()
+if __name__ == "__main__":
+    dungeon = Dungeon(6)
+    dungeon.run()
 
 def play_game():
     # Run the game
@@ -324,4 +309,5 @@ def play_game():
         print("Thank you for playing!")
 
 # Play the game
-play_game()
\ No newline at end of file
+if __name__ == "__main__":
+    play_game()
\ No newline at end of file
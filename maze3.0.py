@@ -1,4 +1,169 @@
+import argparse
+import asyncio
+import codecs
+import heapq
+import io
+import json
+import mmap
+import multiprocessing
+import os
+import pickle
 import random
+import shutil
+import struct
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from array import array
+from collections import Counter, OrderedDict, deque
+from functools import lru_cache
+
+from spatial_index import SpatialIndex
+
+try:
+    import numpy as np
+except ImportError:  # only the batched combat helpers need NumPy
+    np = None
+
+# --- Game Output ---
+
+# Every message the game can show, keyed by event kind. Game code only emits
+# (kind, data) records; the console is the one place that turns them into text.
+MESSAGES = {
+    "potion_used": "You used a Health Potion and gained {amount} health.",
+    "no_potion": "You don't have a Health Potion to use.",
+    "player_attack": "You attacked the {enemy} and dealt {damage} damage!",
+    "weapon_effect": "Your weapon inflicts {effect} on the {enemy}!",
+    "enemy_defeated": "You defeated the {enemy}!\nYou gained {xp} XP and {gold} gold.",
+    "defend": "The {enemy} attacked you and dealt {damage} damage.",
+    "poison_tick": "You take 3 poison damage!",
+    "burn_tick": "You suffer 4 burn damage!",
+    "freeze_tick": "You're frozen and lose your turn!",
+    "level_up": "\nYou leveled up to level {level}!\nMax Health increased to {max_health}\nAttack Power increased to {attack_power}",
+    "unlock_gold_finder": "You've unlocked Gold Finder: +5 gold after each kill.",
+    "unlock_regen": "You've unlocked Passive Regen: Heal 1 HP per move.",
+    "unequip": "You unequipped the {weapon}",
+    "equip": "You equipped the {weapon}",
+    "equip_invalid": "You don't have a valid weapon to equip.",
+    "lifesteal": "The {enemy} drains life and heals for {amount}!",
+    "freeze": "The {enemy} freezes you for 3 turns!",
+    "double_strike": "The {enemy} strikes twice!",
+    "enemy_attack": "The {enemy} attacked you and dealt {damage} damage.",
+    "boss": "A powerful boss guards this floor! The {boss} lurks nearby...",
+    "boss_drop": "✨ The boss dropped a unique weapon: {weapon}!",
+    "floor": "===== Entering Floor {floor} =====",
+    "status": "Position: ({x}, {y}) - {room}\nHealth: {health} | XP: {xp} | Gold: {gold} | Level: {level} | Floor: {floor}",
+    "quit": "Thanks for playing!",
+    "saved": "Game saved to {path}.",
+    "invalid_choice": "Invalid choice!",
+    "gate": "You reach the Sealed Gate.",
+    "leave_dungeon": "You chose to exit the dungeon.",
+    "final_score": "Final Score: {score}",
+    "died": "You have died. Game Over!",
+    "completed": "You conquered the final floor of the dungeon!",
+    "blocked": "You can't move that way.",
+    "lore": "{text}",
+    "found_item": "You found a {item}!",
+    "treasure": "You found a treasure chest with {gold} gold!",
+    "enchant_intro": "You enter a glowing chamber with ancient runes etched in the stone.",
+    "enchant_offer": "Your current weapon is: {weapon}\nYou may enchant it with a status effect for 30 gold.",
+    "enchant_already": "Your weapon is already enchanted! You can't add another enchantment.",
+    "enchanted": "Your weapon is now enchanted with {effect}!",
+    "enchant_cancel": "You leave the enchantment chamber untouched.",
+    "enchant_fail": "Not enough gold or invalid choice.",
+    "enchant_no_weapon": "You need a weapon to enchant.",
+    "blacksmith_intro": "You meet a grizzled blacksmith hammering at a forge.",
+    "blacksmith_offer": "Your weapon: {weapon} ({min_damage}-{max_damage})\nWould you like to upgrade your weapon for 50 gold? +3 min/max damage",
+    "upgraded": "Your weapon has been reforged and is stronger!",
+    "no_gold": "You don't have enough gold.",
+    "upgrade_declined": "Maybe next time.",
+    "blacksmith_scoff": "The blacksmith scoffs. 'No weapon? Come back when you have something worth forging.'",
+    "trap": "It's a trap! You took {damage} damage.",
+    "exit_unlocked": "🎉 You unlocked the exit and escaped the dungeon!",
+    "exit_locked": "The exit is locked. You need a key!",
+    "encounter": "You encountered a {enemy}! {ability} Boss incoming!",
+    "frozen_skip": "❄️ You are frozen and skip this turn!",
+    "battle_round": "Player Health: {player_health}\nEnemy Health: {enemy_health}",
+    "shop_open": "Welcome to the Shop!\nGold: {gold}",
+    "bought": "You bought {item}.",
+    "not_enough_gold": "Not enough gold.",
+    "leave_shop": "Leaving the shop.",
+    "shop_invalid_choice": "Invalid choice.",
+    "shop_invalid_input": "Invalid input.",
+    "inventory_empty": "Your inventory is empty.",
+    "only_weapons": "You can only equip weapons.",
+    "invalid_selection": "Invalid selection.",
+}
+
+# Sinks may hold events back until flush(), which the game calls right before it
+# waits on a prompt and once more when play_game returns.
+class ConsoleOutput:
+    # Collects the formatted lines of a turn and writes them with a single call.
+    def __init__(self, stream=None):
+        self.stream = stream  # None means whatever sys.stdout is at flush time
+        self.pending = []
+
+    def emit(self, kind, **data):
+        self.pending.append(MESSAGES[kind].format(**data))
+
+    def flush(self):
+        if self.pending:
+            stream = self.stream or sys.stdout
+            self.pending.append("")
+            stream.write("\n".join(self.pending))
+            stream.flush()
+            self.pending.clear()
+
+class JsonLinesOutput:
+    # One JSON object per event ({"event": kind, ...data}), for logs and external tools.
+    def __init__(self, stream):
+        self.stream = stream
+        self.pending = []
+
+    def emit(self, kind, **data):
+        self.pending.append(json.dumps({"event": kind, **data}, ensure_ascii=False) + "\n")
+
+    def flush(self):
+        if self.pending:
+            self.stream.write("".join(self.pending))
+            self.stream.flush()
+            self.pending.clear()
+
+class EventRecorder:
+    # Headless output: keeps every event as a (kind, data) record instead of printing it.
+    def __init__(self):
+        self.events = []
+
+    def emit(self, kind, **data):
+        self.events.append((kind, data))
+
+    def flush(self):
+        pass
+
+class NullOutput:
+    def emit(self, kind, **data):
+        pass
+
+    def flush(self):
+        pass
+
+CONSOLE = ConsoleOutput()
+
+# --- Random Streams ---
+
+class RandomStreams:
+    # Independent, reproducible random streams for one game. Each subsystem draws from
+    # its own stream, so extra combat rolls never shift a later map or loot roll, and
+    # the same seed replays a game bit for bit. Streams are seeded from a hash of
+    # (seed, name), so games with different seeds never share a stream.
+    NAMES = ("generation", "combat", "loot")
+
+    def __init__(self, seed):
+        self.seed = seed
+        for name in self.NAMES:
+            setattr(self, name, random.Random(f"maze3:{seed}:{name}"))
 
 # --- Entity Classes ---
 
@@ -8,7 +173,7 @@ class Entity:
         self.description = description
 
 class Player(Entity):
-    def __init__(self, name):
+    def __init__(self, name, out=CONSOLE, rng=random):
         super().__init__(name, "The player")
         self.level = 1
         self.health = 100
@@ -21,6 +186,9 @@ class Player(Entity):
         self.status_effects = {}  # Tracks status effects like poison, burn, and freeze
         self.x = 0
         self.y = 0
+        self.out = out
+        self.rng = rng  # combat rolls for this player and the enemies it fights
+        self.last_damage_source = None  # Who or what hit the player last, reported as the cause of death
 
     def is_alive(self):
         return self.health > 0
@@ -37,14 +205,14 @@ class Player(Entity):
             self.inventory.remove(potion)
             healed_amount = min(20, self.max_health - self.health)
             self.health += healed_amount
-            print(f"You used a Health Potion and gained {healed_amount} health.")
+            self.out.emit("potion_used", amount=healed_amount)
         else:
-            print("You don't have a Health Potion to use.")
+            self.out.emit("no_potion")
 
     def attack(self, enemy):
         damage = self.calculate_damage()
         self.apply_weapon_effect(enemy)
-        print(f"You attacked the {enemy.name} and dealt {damage} damage!")
+        self.out.emit("player_attack", enemy=enemy.name, damage=damage)
         enemy.take_damage(damage)
 
         if not enemy.is_alive():
@@ -52,15 +220,15 @@ class Player(Entity):
 
     def calculate_damage(self):
         if self.weapon:
-            return random.randint(self.weapon.min_damage, self.weapon.max_damage)
-        return random.randint(self.attack_power // 2, self.attack_power)
+            return self.rng.randint(self.weapon.min_damage, self.weapon.max_damage)
+        return self.rng.randint(self.attack_power // 2, self.attack_power)
 
     def apply_weapon_effect(self, enemy):
         if self.weapon and hasattr(self.weapon, 'effect') and self.weapon.effect:
             effect = self.weapon.effect
             enemy.status_effects = getattr(enemy, 'status_effects', {})
             enemy.status_effects[effect] = 3
-            print(f"Your weapon inflicts {effect} on the {enemy.name}!")
+            self.out.emit("weapon_effect", effect=effect, enemy=enemy.name)
 
     def process_enemy_defeat(self, enemy):
         self.xp += enemy.xp
@@ -68,8 +236,7 @@ class Player(Entity):
         if self.level >= 3:
             gold_dropped += 5
         self.gold += gold_dropped
-        print(f"You defeated the {enemy.name}!")
-        print(f"You gained {enemy.xp} XP and {gold_dropped} gold.")
+        self.out.emit("enemy_defeated", enemy=enemy.name, xp=enemy.xp, gold=gold_dropped)
         while self.xp >= self.level * 20:
             self.xp -= self.level * 20
             self.level_up()
@@ -77,7 +244,8 @@ class Player(Entity):
     def defend(self, enemy):
         damage = max(0, enemy.attack_power - 5)
         self.health -= damage
-        print(f"The {enemy.name} attacked you and dealt {damage} damage.")
+        self.last_damage_source = enemy.name
+        self.out.emit("defend", enemy=enemy.name, damage=damage)
 
     def take_damage(self, damage):
         self.health = max(0, self.health - damage)
@@ -87,7 +255,8 @@ class Player(Entity):
             poison_turns = self.status_effects['poison']
             if poison_turns > 0:
                 self.health -= 3
-                print("You take 3 poison damage!")
+                self.last_damage_source = "poison"
+                self.out.emit("poison_tick")
                 self.status_effects['poison'] -= 1
             if self.status_effects['poison'] <= 0:
                 del self.status_effects['poison']
@@ -95,14 +264,15 @@ class Player(Entity):
             burn_turns = self.status_effects['burn']
             if burn_turns > 0:
                 self.health -= 4
-                print("You suffer 4 burn damage!")
+                self.last_damage_source = "burn"
+                self.out.emit("burn_tick")
                 self.status_effects['burn'] -= 1
             if self.status_effects['burn'] <= 0:
                 del self.status_effects['burn']
         if 'freeze' in self.status_effects:
             freeze_turns = self.status_effects['freeze']
             if freeze_turns > 0:
-                print("You're frozen and lose your turn!")
+                self.out.emit("freeze_tick")
                 self.status_effects['freeze'] -= 1
             if self.status_effects['freeze'] <= 0:
                 del self.status_effects['freeze']
@@ -113,25 +283,23 @@ class Player(Entity):
         self.health = self.max_health
         self.attack_power += 3
 
-        print(f"\nYou leveled up to level {self.level}!")
-        print(f"Max Health increased to {self.max_health}")
-        print(f"Attack Power increased to {self.attack_power}")
+        self.out.emit("level_up", level=self.level, max_health=self.max_health, attack_power=self.attack_power)
 
         if self.level == 3:
-            print("You've unlocked Gold Finder: +5 gold after each kill.")
+            self.out.emit("unlock_gold_finder")
         if self.level == 5:
-            print("You've unlocked Passive Regen: Heal 1 HP per move.")
+            self.out.emit("unlock_regen")
 
     def equip_weapon(self, weapon):
         if weapon in self.inventory and isinstance(weapon, Weapon):
             if self.weapon:
                 self.inventory.append(self.weapon)
-                print(f"You unequipped the {self.weapon.name}")
+                self.out.emit("unequip", weapon=self.weapon.name)
             self.weapon = weapon
             self.inventory.remove(weapon)
-            print(f"You equipped the {weapon.name}")
+            self.out.emit("equip", weapon=weapon.name)
         else:
-            print("You don't have a valid weapon to equip.")
+            self.out.emit("equip_invalid")
 
     def get_score(self):
         return self.level * 100 + len(self.inventory) * 10 + self.gold
@@ -158,22 +326,24 @@ class Enemy(Entity):
         return self.gold
 
     def attack(self, player):
-        damage = random.randint(self.attack_power // 2, self.attack_power)
+        out, rng = player.out, player.rng
+        damage = rng.randint(self.attack_power // 2, self.attack_power)
         if self.ability == "lifesteal":
             self.health += damage // 3
-            print(f"The {self.name} drains life and heals for {damage // 3}!")
+            out.emit("lifesteal", enemy=self.name, amount=damage // 3)
         elif self.ability == "poison":
             player.status_effects['poison'] = 3
         elif self.ability == "burn":
             player.status_effects['burn'] = 3
         elif self.ability == "freeze":
             player.status_effects['freeze'] = 1
-            print(f"The {self.name} freezes you for 3 turns!")
-        elif self.ability == "double_strike" and random.random() < 0.25:
-            print(f"The {self.name} strikes twice!")
+            out.emit("freeze", enemy=self.name)
+        elif self.ability == "double_strike" and rng.random() < 0.25:
+            out.emit("double_strike", enemy=self.name)
             player.take_damage(damage)
+        player.last_damage_source = self.name
         player.take_damage(damage)
-        print(f"The {self.name} attacked you and dealt {damage} damage.")
+        out.emit("enemy_attack", enemy=self.name, damage=damage)
 
 class Item:
     def __init__(self, name, description):
@@ -188,17 +358,911 @@ class Weapon(Item):
         self.price = price
         self.effect = None
 
+# --- Player Policies ---
+
+# A policy answers every prompt the game would otherwise read with input().
+# Each prompt site has its own method, called with the game (and the enemy for
+# "battle"), and returns exactly what a player would have typed.
+class Policy:
+    def choose(self, site, prompt, game, **context):
+        return getattr(self, site)(game, **context)
+
+    def name(self, game):
+        return "Bot"
+
+    def action(self, game):
+        return "7"
+
+    def descend(self, game):
+        return "y"
+
+    def battle(self, game, enemy):
+        return "1"
+
+    def shop(self, game):
+        return str(len(game.shop_items) + 1)
+
+    def inventory(self, game):
+        return ""
+
+    def enchant(self, game):
+        return "4"
+
+    def blacksmith(self, game):
+        return "n"
+
+class HumanPolicy(Policy):
+    def choose(self, site, prompt, game, **context):
+        return input(prompt)
+
+class GreedyPolicy(Policy):
+    # Heads for the key, then the exit; keeps a potion stocked, buys the best
+    # weapon it can afford and takes every enchantment and upgrade it can pay for.
+    MOVES = (("1", -1, 0), ("2", 1, 0), ("3", 0, -1), ("4", 0, 1))
+
+    def __init__(self, seed=None, potion_threshold=0.35):
+        self.rng = random.Random(seed)
+        self.potion_threshold = potion_threshold
+
+    def _potions(self, player):
+        return sum(1 for item in player.inventory if item.name == "Health Potion")
+
+    def _spare_weapon(self, player):
+        current = player.weapon.max_damage if player.weapon else player.attack_power
+        spare = [item for item in player.inventory if isinstance(item, Weapon) and item.max_damage > current]
+        return max(spare, key=lambda w: w.max_damage) if spare else None
+
+    def _affordable_weapon(self, game):
+        player = game.player
+        current = player.weapon.max_damage if player.weapon else player.attack_power
+        best = None
+        for i, item in enumerate(game.shop_items, 1):
+            if isinstance(item, Weapon) and item.price <= player.gold and item.max_damage > current:
+                if best is None or item.max_damage > game.shop_items[best - 1].max_damage:
+                    best = i
+        return best
+
+    def _target(self, game):
+        if game.exit_coords is None:
+            return None  # endless worlds have no exit to head for
+        if game.player.has_item("Key"):
+            return game.exit_coords
+        keys = [cell for obj, cell in game.entities if isinstance(obj, Item) and obj.name == "Key"]
+        if keys:
+            return min(keys, key=lambda cell: (cell[1], cell[0]))  # the first in reading order
+        return game.exit_coords
+
+    def action(self, game):
+        player = game.player
+        if self._spare_weapon(player):
+            return "6"
+        if self._affordable_weapon(game) or (player.gold >= 10 and self._potions(player) < 2):
+            return "5"
+        return self._move(game, self._target(game))
+
+    def _move(self, game, target):
+        player = game.player
+        best, options = None, []
+        for key, dx, dy in self.MOVES:
+            nx, ny = player.x + dx, player.y + dy
+            if 0 <= nx < game.width and 0 <= ny < game.height and game.rooms[ny][nx] is not None:
+                distance = abs(target[0] - nx) + abs(target[1] - ny) if target else 0
+                if best is None or distance < best:
+                    best, options = distance, [key]
+                elif distance == best:
+                    options.append(key)
+        return self.rng.choice(options) if options else "7"
+
+    def battle(self, game, enemy):
+        player = game.player
+        if player.health < player.max_health * self.potion_threshold and self._potions(player):
+            return "3"
+        return "1"
+
+    def shop(self, game):
+        choice = self._affordable_weapon(game)
+        return str(choice) if choice else "1"
+
+    def inventory(self, game):
+        weapon = self._spare_weapon(game.player)
+        return str(game.player.inventory.index(weapon) + 1) if weapon else ""
+
+    def enchant(self, game):
+        return self.rng.choice("123")
+
+    def blacksmith(self, game):
+        return "y"
+
+class PathPolicy(GreedyPolicy):
+    # The greedy bot, but it walks the shortest open route to its target instead of
+    # closing the straight-line distance, so it doesn't walk into dead ends.
+    def _move(self, game, target):
+        route = game.pathfinder.path(target) if target else None
+        if route:
+            x, y = route[0]
+            for key, dx, dy in self.MOVES:
+                if (game.player.x + dx, game.player.y + dy) == (x, y):
+                    return key
+        return super()._move(game, target)
+
+# --- Maze Generators ---
+
+# Each generator carves a connected set of `target` cells that contains `start` and
+# returns it as an array('I') of flat cell indices (y * width + x) with the start cell
+# first; a list of int objects would cost about ten times the memory on large floors.
+# Internally they work on a bytearray of cell states padded with a solid border, so
+# neighbours are always i - 1, i + 1, i - W and i + W with no bounds checks, and the
+# cost stays linear in the number of cells.
+
+SOLID, FRONTIER, CARVED, BORDER = 0, 1, 2, 3
+
+def _padded_grid(width, height):
+    stride = width + 2
+    state = bytearray([BORDER]) * (stride * (height + 2))
+    row = bytearray(width)
+    for y in range(1, height + 1):
+        state[y * stride + 1:y * stride + 1 + width] = row
+    return state, stride
+
+def _pad(width, stride, i):
+    return (i // width + 1) * stride + i % width + 1
+
+def _unpad(width, stride, cells):
+    # in place, so a large floor never holds two copies of its cells
+    for k, i in enumerate(cells):
+        cells[k] = (i // stride - 1) * width + i % stride - 1
+    return cells
+
+def _grow(state, stride, carved, target, rng):
+    # Randomized Prim: carve a random frontier cell until the target is met.
+    frontier = array("I")
+    for i in carved:
+        for j in (i - 1, i + 1, i - stride, i + stride):
+            if state[j] == SOLID:
+                state[j] = FRONTIER
+                frontier.append(j)
+    # This loop runs once per carved cell, so it is unrolled and works on locals only.
+    rand = rng.random
+    append = carved.append
+    add = frontier.append
+    take = frontier.pop
+    grown, edge = CARVED, FRONTIER
+    count = len(carved)
+    while count < target and frontier:
+        k = int(rand() * len(frontier))
+        i = frontier[k]
+        frontier[k] = frontier[-1]
+        take()
+        state[i] = grown
+        append(i)
+        count += 1
+        j = i - 1
+        if not state[j]:
+            state[j] = edge
+            add(j)
+        j = i + 1
+        if not state[j]:
+            state[j] = edge
+            add(j)
+        j = i - stride
+        if not state[j]:
+            state[j] = edge
+            add(j)
+        j = i + stride
+        if not state[j]:
+            state[j] = edge
+            add(j)
+    for i in frontier:
+        state[i] = SOLID
+    return carved
+
+def _prune(state, stride, carved, target, rng):
+    # Removes dead ends until only target cells remain. Dropping a cell with a single
+    # carved neighbour never disconnects the rest; the start cell is never dropped.
+    start = carved[0]
+
+    def degree(i):
+        return ((state[i - 1] == CARVED) + (state[i + 1] == CARVED)
+                + (state[i - stride] == CARVED) + (state[i + stride] == CARVED))
+
+    leaves = array("I", (i for i in carved if i != start and degree(i) <= 1))
+    rng.shuffle(leaves)
+    count = len(carved)
+    while count > target and leaves:
+        i = leaves.pop()
+        state[i] = SOLID
+        count -= 1
+        for j in (i - 1, i + 1, i - stride, i + stride):
+            if j != start and state[j] == CARVED and degree(j) == 1:
+                leaves.append(j)
+    return array("I", (i for i in carved if state[i] == CARVED))
+
+def carve_walk(width, height, start, target, rng=random, max_steps=None):
+    # The original random walk; it revisits cells, so it is capped at max_steps moves
+    # and may return fewer than target cells.
+    max_steps = max_steps if max_steps is not None else 50 * width * height
+    x, y = start
+    visited = bytearray(width * height)
+    visited[y * width + x] = 1
+    carved = array("I", [y * width + x])
+    while len(carved) < target and max_steps > 0:
+        max_steps -= 1
+        direction = rng.choice([(1,0), (-1,0), (0,1), (0,-1)])
+        nx, ny = x + direction[0], y + direction[1]
+        if 0 <= nx < width and 0 <= ny < height:
+            if not visited[ny * width + nx]:
+                visited[ny * width + nx] = 1
+                carved.append(ny * width + nx)
+            x, y = nx, ny
+    return carved
+
+def carve_prim(width, height, start, target, rng=random):
+    state, stride = _padded_grid(width, height)
+    first = _pad(width, stride, start[1] * width + start[0])
+    state[first] = CARVED
+    return _unpad(width, stride, _grow(state, stride, array("I", [first]), target, rng))
+
+def carve_backtracker(width, height, start, target, rng=random):
+    # Depth-first corridors from an explicit stack. A cell is only dug if that does not
+    # open it onto another corridor, so the result is a tree of one-cell-wide passages;
+    # if those run out before the target, the rest is grown from them.
+    state, stride = _padded_grid(width, height)
+    first = _pad(width, stride, start[1] * width + start[0])
+    state[first] = CARVED
+    carved = array("I", [first])
+    stack = array("I", [first])
+
+    def diggable(j):
+        # solid, and the only carved cell next to it is the one we are digging from
+        return state[j] == SOLID and ((state[j - 1] == CARVED) + (state[j + 1] == CARVED)
+                                      + (state[j - stride] == CARVED) + (state[j + stride] == CARVED)) == 1
+
+    while stack and len(carved) < target:
+        i = stack[-1]
+        options = [j for j in (i - 1, i + 1, i - stride, i + stride) if diggable(j)]
+        if not options:
+            stack.pop()
+            continue
+        j = options[int(rng.random() * len(options))]
+        state[j] = CARVED
+        carved.append(j)
+        stack.append(j)
+    return _unpad(width, stride, _grow(state, stride, carved, target, rng))
+
+def carve_kruskal(width, height, start, target, rng=random):
+    # Kruskal over a lattice of rooms on the start cell's parity, joined through the
+    # wall cells between them with a union-find. That gives a perfect maze of about
+    # half the grid; dead ends are then trimmed, or the edges grown, to hit the target.
+    state, stride = _padded_grid(width, height)
+    parent = array("I", range(len(state)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    # Each wall is stored as 2 * room + (0 for the one east of it, 1 for the one south).
+    walls = array("Q")
+    for y in range(start[1] % 2, height, 2):
+        for x in range(start[0] % 2, width, 2):
+            i = _pad(width, stride, y * width + x)
+            if x + 2 < width:
+                walls.append(2 * i)
+            if y + 2 < height:
+                walls.append(2 * i + 1)
+    rng.shuffle(walls)
+
+    first = _pad(width, stride, start[1] * width + start[0])
+    state[first] = CARVED
+    carved = array("I", [first])
+    for w in walls:
+        a, step = w >> 1, stride if w & 1 else 1
+        wall, b = a + step, a + 2 * step
+        ra, rb = find(a), find(b)
+        if ra != rb:
+            parent[ra] = rb
+            for i in (a, wall, b):
+                if state[i] == SOLID:
+                    state[i] = CARVED
+                    carved.append(i)
+    if len(carved) > target:
+        carved = _prune(state, stride, carved, target, rng)
+    return _unpad(width, stride, _grow(state, stride, carved, target, rng))
+
+def carve_binary_tree(width, height, start, target, rng=random):
+    # Binary-tree maze on the start cell's lattice: every room opens the wall to its north
+    # or west neighbour, which links all rooms to the top-left one. Each room decides on
+    # its own, so with NumPy the whole grid is carved in a few array operations; this is
+    # the generator to use for very large maps.
+    if np is None:
+        return carve_kruskal(width, height, start, target, rng)
+    gen = np.random.default_rng(rng.getrandbits(64))
+    carved = np.zeros((height, width), dtype=bool)
+    ys, xs = start[1] % 2, start[0] % 2
+    rows, cols = len(range(ys, height, 2)), len(range(xs, width, 2))
+    carved[ys::2, xs::2] = True
+    # views of the wall cells one step north / west of each room
+    north_walls = carved[ys + 1:ys + 2 * rows - 1:2, xs::2]
+    west_walls = carved[ys::2, xs + 1:xs + 2 * cols - 1:2]
+    north = gen.random((rows, cols)) < 0.5
+    north[0, :] = False
+    north[:, 0] = True
+    north_walls[:] = north[1:, :]
+    west_walls[:] = ~north[:, 1:]
+    count = int(carved.sum())
+    if count < target:
+        # Open extra walls between rooms; both sides are already carved, so it stays connected.
+        closed_north = np.nonzero(~north_walls)
+        closed_west = np.nonzero(~west_walls)
+        total = closed_north[0].size + closed_west[0].size
+        picks = gen.permutation(total)[:target - count]
+        split = closed_north[0].size
+        chosen = picks[picks < split]
+        north_walls[closed_north[0][chosen], closed_north[1][chosen]] = True
+        chosen = picks[picks >= split] - split
+        west_walls[closed_west[0][chosen], closed_west[1][chosen]] = True
+        count += picks.size
+        del closed_north, closed_west, picks, chosen
+    first = start[1] * width + start[0]
+    rest = np.flatnonzero(carved.ravel()).astype(np.uint32)
+    cells = array("I", [first])
+    cells.frombytes(rest[rest != first].view(np.uint8))
+    del rest
+    if count != target:
+        state, stride = _padded_grid(width, height)
+        padded = cells
+        for k, i in enumerate(padded):
+            padded[k] = _pad(width, stride, i)
+        for i in padded:
+            state[i] = CARVED
+        if count > target:
+            padded = _prune(state, stride, padded, target, rng)
+        cells = _unpad(width, stride, _grow(state, stride, padded, target, rng))
+    return cells
+
+GENERATORS = {
+    "walk": carve_walk,
+    "prim": carve_prim,
+    "backtracker": carve_backtracker,
+    "kruskal": carve_kruskal,
+    "binary_tree": carve_binary_tree,
+}
+
+# --- Compact Grid ---
+
+# Room kinds a compact grid stores inline, one byte per cell. Any other object in a
+# cell (Enemy, Item, Weapon, the Player) is kept in a side table keyed by cell index.
+ROOM_CODES = [None, "Empty", "Exit", "Trap", "Treasure", "Enchantment", "Blacksmith"]
+ROOM_CODE_OF = {kind: code for code, kind in enumerate(ROOM_CODES)}
+ENTITY = len(ROOM_CODES)
+
+class GridRow:
+    # One row of a FlatGrid; supports the same grid[y][x] reads and writes as a list.
+    def __init__(self, grid, y):
+        self.grid = grid
+        self.offset = y * grid.width
+
+    def __len__(self):
+        return self.grid.width
+
+    def __getitem__(self, x):
+        if not 0 <= x < self.grid.width:
+            raise IndexError("grid column out of range")
+        return self.grid.get(self.offset + x)
+
+    def __setitem__(self, x, value):
+        if not 0 <= x < self.grid.width:
+            raise IndexError("grid column out of range")
+        self.grid.set(self.offset + x, value)
+
+    def __iter__(self):
+        get = self.grid.get
+        return (get(i) for i in range(self.offset, self.offset + self.grid.width))
+
+class FlatGrid:
+    def __len__(self):
+        return self.height
+
+    def __getitem__(self, y):
+        if not 0 <= y < self.height:
+            raise IndexError("grid row out of range")
+        return GridRow(self, y)
+
+    def __iter__(self):
+        return (GridRow(self, y) for y in range(self.height))
+
+class CompactRooms(FlatGrid):
+    # Drop-in replacement for DungeonBase.rooms: a bytearray of ROOM_CODES plus a dict
+    # for the cells that hold objects.
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.codes = bytearray(width * height)
+        self.entities = {}
+
+    def get(self, i):
+        code = self.codes[i]
+        if code == ENTITY:
+            return self.entities[i]
+        return ROOM_CODES[code]
+
+    def set(self, i, value):
+        if value is None or isinstance(value, str):
+            self.codes[i] = ROOM_CODE_OF[value]
+            self.entities.pop(i, None)
+        else:
+            self.codes[i] = ENTITY
+            self.entities[i] = value
+
+    def fill(self, cells, value):
+        code = ROOM_CODE_OF[value]
+        codes = self.codes
+        for i in cells:
+            codes[i] = code
+
+# --- Room Names ---
+
+ROOM_LORE = {
+    "Treasure": ("Glittering Vault", "The air shimmers with unseen magic. Ancient riches may lie within."),
+    "Trap": ("Booby-Trapped Passage", "This corridor is riddled with pressure plates and crumbled bones."),
+    "Enemy": ("Cursed Hall", "The shadows shift... something watches from the dark."),
+    "Exit": ("Sealed Gate", "Massive stone doors sealed by arcane runes. It might be the only way out."),
+    "Key": ("Hidden Niche", "A hollow carved into the wall, forgotten by time. Something valuable glints inside."),
+    "Empty": ("Silent Chamber", "Dust covers everything. It appears long abandoned."),
+    "default": (None, None)
+}
+LORE_TEXT = {name: text for name, text in ROOM_LORE.values() if name}
+
+ROOM_ADJECTIVES = [
+    "Collapsed", "Echoing", "Gloomy", "Withered", "Fungal", "Whispering", "Icy",
+    "Dust-choked", "Ancient", "Haunted", "Buried", "Broken", "Wretched", "Twisting"
+]
+ROOM_NOUNS = [
+    "Passage", "Fissure", "Grotto", "Vault", "Sanctum", "Shrine",
+    "Cellar", "Refuge", "Gallery", "Crypt", "Atrium", "Chapel", "Workshop", "Quarters"
+]
+MASK64 = (1 << 64) - 1
+
+def mix64(value):
+    # splitmix64 finaliser: a cheap, well-spread hash that is the same on every platform
+    value = (value ^ (value >> 30)) * 0xBF58476D1CE4E5B9 & MASK64
+    value = (value ^ (value >> 27)) * 0x94D049BB133111EB & MASK64
+    return value ^ (value >> 31)
+
+def room_name(seed, floor, x, y):
+    h = mix64((seed * 0x9E3779B97F4A7C15 + floor * 0x632BE59BD9B4E019 + y * 0x85EBCA77C2B2AE63 + x) & MASK64)
+    return f"{ROOM_ADJECTIVES[h % len(ROOM_ADJECTIVES)]} {ROOM_NOUNS[(h >> 32) % len(ROOM_NOUNS)]}"
+
+class RoomNames(FlatGrid):
+    # Drop-in replacement for the room_names list of lists. A cell's name is worked out
+    # from (seed, floor, x, y) only when something reads it; the only thing stored is
+    # the handful of cells handle_room renames.
+    def __init__(self, width, height, seed, floor):
+        self.width = width
+        self.height = height
+        self.seed = seed
+        self.floor = floor
+        self.renamed = {}
+
+    def get(self, i):
+        name = self.renamed.get(i)
+        if name is None:
+            name = room_name(self.seed, self.floor, i % self.width, i // self.width)
+        return name
+
+    def set(self, i, name):
+        self.renamed[i] = name
+
+# --- Pathfinding ---
+
+UNREACHABLE = -1
+OPEN_CODES = bytes([0] + [1] * 255)  # ROOM_CODES byte -> 1 if a player can stand there
+
+def open_cells(rooms, width, height):
+    # One byte per cell: 1 for any room that is not None (the player's own cell included).
+    if isinstance(rooms, CompactRooms):
+        return bytearray(rooms.codes[:].translate(OPEN_CODES))
+    if not isinstance(rooms, list):
+        raise TypeError("pathfinding needs a DungeonBase grid; streaming worlds are unbounded")
+    return bytearray(room is not None for row in rooms for room in row)
+
+def _neighbours(i, width, size):
+    x = i % width
+    if x > 0:
+        yield i - 1
+    if x < width - 1:
+        yield i + 1
+    if i >= width:
+        yield i - width
+    if i + width < size:
+        yield i + width
+
+class DistanceField:
+    # Moves from every open cell to one target cell, UNREACHABLE where there is no way.
+    # Cells only ever close during a floor, so block() repairs the field in place: it
+    # finds the cells that lost their last shortest route and re-solves only those.
+    def __init__(self, open_cells, width, target):
+        self.open = open_cells  # shared with the Pathfinder, which keeps it current
+        self.width = width
+        self.target = target
+        self.dist = array("i", [UNREACHABLE]) * len(open_cells)
+        if open_cells[target]:
+            self.dist[target] = 0
+            self.spread(deque([target]))
+
+    def spread(self, queue):
+        dist, is_open, width, size = self.dist, self.open, self.width, len(self.open)
+        while queue:
+            i = queue.popleft()
+            d = dist[i] + 1
+            x = i % width
+            if x > 0 and dist[i - 1] == UNREACHABLE and is_open[i - 1]:
+                dist[i - 1] = d
+                queue.append(i - 1)
+            if x < width - 1 and dist[i + 1] == UNREACHABLE and is_open[i + 1]:
+                dist[i + 1] = d
+                queue.append(i + 1)
+            if i >= width and dist[i - width] == UNREACHABLE and is_open[i - width]:
+                dist[i - width] = d
+                queue.append(i - width)
+            if i + width < size and dist[i + width] == UNREACHABLE and is_open[i + width]:
+                dist[i + width] = d
+                queue.append(i + width)
+
+    def block(self, i):
+        dist, is_open, width, size = self.dist, self.open, self.width, len(self.open)
+        old = dist[i]
+        if old == UNREACHABLE:
+            return
+        dist[i] = UNREACHABLE
+        if i == self.target:
+            self.dist = array("i", [UNREACHABLE]) * size
+            return
+        # Walk outwards one distance layer at a time; a cell is affected when none of its
+        # open neighbours is still one move closer.
+        affected = set()
+        queue = deque(n for n in _neighbours(i, width, size) if dist[n] == old + 1)
+        while queue:
+            c = queue.popleft()
+            d = dist[c]
+            if d == UNREACHABLE:
+                continue
+            if any(dist[n] == d - 1 and is_open[n] for n in _neighbours(c, width, size)):
+                continue
+            dist[c] = UNREACHABLE
+            affected.add(c)
+            queue.extend(n for n in _neighbours(c, width, size) if dist[n] == d + 1)
+        # Re-solve the affected cells from the unaffected ones around them.
+        heap = []
+        for c in affected:
+            best = min((dist[n] for n in _neighbours(c, width, size) if dist[n] != UNREACHABLE), default=None)
+            if best is not None:
+                heap.append((best + 1, c))
+        heapq.heapify(heap)
+        while heap:
+            d, c = heapq.heappop(heap)
+            if dist[c] != UNREACHABLE and dist[c] <= d:
+                continue
+            dist[c] = d
+            for n in _neighbours(c, width, size):
+                if n in affected and (dist[n] == UNREACHABLE or dist[n] > d + 1):
+                    heapq.heappush(heap, (d + 1, n))
+
+def descend(dist, i, width):
+    # The cells from i down a distance field to its target, i itself excluded.
+    size = len(dist)
+    route = []
+    while dist[i]:
+        i = next(n for n in _neighbours(i, width, size) if dist[n] == dist[i] - 1)
+        route.append(i)
+    return route
+
+class Pathfinder:
+    # Shortest routes over a game's open cells. A distance field is built the first time a
+    # target is asked about and reused until the floor changes, so later questions about
+    # it are a lookup (distance) or a walk down the field (path). handle_room reports the
+    # cell the player leaves, which becomes None, through block().
+    def __init__(self, game, max_fields=8):
+        self.game = game
+        self.max_fields = max_fields
+        self.rooms = None  # the grid the cached fields belong to
+        self.open = None
+        self.fields = OrderedDict()  # target index -> DistanceField, least recently used first
+
+    def sync(self):
+        game = self.game
+        if game.rooms is not self.rooms:
+            self.open = open_cells(game.rooms, game.width, game.height)
+            self.rooms = game.rooms
+            self.fields.clear()
+
+    def field(self, target):
+        self.sync()
+        i = target[1] * self.game.width + target[0]
+        field = self.fields.get(i)
+        if field is None:
+            field = self.fields[i] = DistanceField(self.open, self.game.width, i)
+            if len(self.fields) > self.max_fields:
+                self.fields.popitem(last=False)
+        else:
+            self.fields.move_to_end(i)
+        return field
+
+    def block(self, x, y):
+        if self.rooms is not self.game.rooms:
+            return  # nothing cached for this grid yet
+        i = y * self.game.width + x
+        self.open[i] = 0
+        for field in self.fields.values():
+            field.block(i)
+
+    def _start(self, start):
+        player = self.game.player
+        return start if start is not None else (player.x, player.y)
+
+    def distance(self, target, start=None):
+        # Moves from start (the player by default) to target, or None if it can't be reached.
+        x, y = self._start(start)
+        d = self.field(target).dist[y * self.game.width + x]
+        return None if d == UNREACHABLE else d
+
+    def path(self, target, start=None):
+        # The cells to walk through, ending on target, or None if it can't be reached.
+        dist, width = self.field(target).dist, self.game.width
+        x, y = self._start(start)
+        i = y * width + x
+        if dist[i] == UNREACHABLE:
+            return None
+        return [(c % width, c // width) for c in descend(dist, i, width)]
+
+    def find_path(self, start, goal):
+        # One-off A* search that builds no field; for a single question about a target that
+        # won't be asked about again.
+        self.sync()
+        width, size, is_open = self.game.width, len(self.open), self.open
+        begin, end = start[1] * width + start[0], goal[1] * width + goal[0]
+        if not (is_open[begin] and is_open[end]):
+            return None
+        gx, gy = goal
+        came = {begin: None}
+        cost = {begin: 0}
+        heap = [(abs(gx - start[0]) + abs(gy - start[1]), 0, begin)]
+        while heap:
+            _, g, i = heapq.heappop(heap)
+            if i == end:
+                route = []
+                while i != begin:
+                    route.append((i % width, i // width))
+                    i = came[i]
+                return route[::-1]
+            if g > cost[i]:
+                continue
+            for n in _neighbours(i, width, size):
+                if is_open[n] and g + 1 < cost.get(n, size):
+                    cost[n] = g + 1
+                    came[n] = i
+                    heapq.heappush(heap, (g + 1 + abs(gx - n % width) + abs(gy - n // width), g + 1, n))
+        return None
+
+# --- Floor Validation ---
+
+# A floor is finished by walking from the start to a key and on to the exit. Entering the
+# exit without a key still closes it behind the player, so the way to the key must avoid it.
+# "reachable" ignores that cells close behind the player; "walkable" shows one route that
+# respects it: the shortest way to the key, then the shortest way on to the exit over the
+# cells still open. Some other route may work where that one doesn't, so "walkable" can
+# only err on the cautious side.
+def _key_cells(game):
+    return [y * game.width + x for obj, (x, y) in game.entities if isinstance(obj, Item) and obj.name == "Key"]
+
+def validate_floor(game):
+    # Returns {"reachable", "walkable", "critical_path", "key", "problem"}. critical_path is
+    # the length of the walkable route when there is one, else the reachable lower bound.
+    width = game.width
+    report = {"reachable": False, "walkable": False, "critical_path": None, "key": None, "problem": None}
+    keys = _key_cells(game)
+    if game.exit_coords is None:
+        report["problem"] = "no exit"
+        return report
+    if not keys:
+        report["problem"] = "no key"
+        return report
+    start = game.player.y * width + game.player.x
+    exit_cell = game.exit_coords[1] * width + game.exit_coords[0]
+    base = open_cells(game.rooms, width, game.height)
+    no_exit = bytearray(base)
+    no_exit[exit_cell] = 0
+    from_exit = DistanceField(base, width, exit_cell).dist
+    best = None
+    for key in keys:
+        to_key = DistanceField(no_exit, width, key).dist
+        if to_key[start] == UNREACHABLE or from_exit[key] == UNREACHABLE:
+            continue
+        length = to_key[start] + from_exit[key]
+        route = descend(to_key, start, width)
+        left = bytearray(base)
+        left[start] = 0
+        for c in route[:-1]:
+            left[c] = 0
+        onward = DistanceField(left, width, exit_cell).dist[key]
+        walkable = onward != UNREACHABLE
+        if walkable:
+            length = len(route) + onward
+        if best is None or (walkable, -length) > (best[0], -best[1]):
+            best = (walkable, length, key)
+    if best is None:
+        report["problem"] = "key unreachable"
+        return report
+    walkable, length, key = best
+    report.update(reachable=True, walkable=walkable, critical_path=length, key=(key % width, key // width))
+    if not walkable:
+        report["problem"] = "not walkable"
+    return report
+
+def repair_floor(game):
+    # Adds what validate_floor found missing without moving anything else: an exit on the
+    # reachable Empty cell farthest from the player, then a key on an Empty cell along the
+    # shortest way there, which makes that way itself a walkable route. Returns the new report.
+    report = validate_floor(game)
+    if report["walkable"]:
+        return report
+    width, player = game.width, game.player
+    start = player.y * width + player.x
+    if game.exit_coords is None:
+        dist = DistanceField(open_cells(game.rooms, width, game.height), width, start).dist
+        empty = [i for i, d in enumerate(dist) if d > 0 and game.rooms[i // width][i % width] == "Empty"]
+        if not empty:
+            return report
+        i = max(empty, key=lambda c: dist[c])
+        game.exit_coords = (i % width, i // width)
+        game.rooms[i // width][i % width] = "Exit"
+    route = game.pathfinder.path(game.exit_coords, (player.x, player.y)) or []
+    for x, y in route[:-1]:
+        if game.rooms[y][x] == "Empty":
+            key = game.rooms[y][x] = Item("Key", "Opens the dungeon exit")
+            game.entities.add(key, (x, y))
+            break
+    return validate_floor(game)
+
 # --- Dungeon System ---
 
+MAX_FLOOR = 18
+FLOOR_ATTEMPTS = 10  # floors generate_dungeon builds before giving up on validation
+
+# (name, min hp, max hp, min attack, max attack, defense) before floor scaling
+ENEMY_TYPES = [
+    ("Goblin", 40, 70, 5, 12, 2),
+    ("Skeleton", 60, 90, 7, 14, 3),
+    ("Orc", 80, 110, 10, 18, 4),
+    ("Wraith", 100, 140, 12, 22, 6),
+    ("Demon", 120, 160, 15, 26, 8),
+    ("Bandit", 50, 80, 6, 14, 3),
+    ("Cultist", 65, 95, 9, 16, 3),
+    ("Ghoul", 70, 100, 8, 15, 4),
+    ("Vampire", 90, 130, 10, 20, 5),
+    ("Troll", 110, 150, 13, 23, 6),
+    ("Lich", 130, 170, 14, 26, 7),
+    ("Minotaur", 140, 180, 16, 28, 8),
+    ("Harpy", 70, 110, 10, 18, 4),
+    ("Werewolf", 100, 140, 12, 20, 5),
+    ("Gargoyle", 90, 130, 10, 22, 6),
+    ("Basilisk", 120, 160, 14, 24, 7),
+    ("Shade", 80, 120, 11, 19, 4),
+    ("Warlock", 110, 150, 15, 25, 6),
+    ("Zombie", 60, 100, 6, 14, 3),
+    ("Revenant", 150, 190, 18, 28, 9),
+    ("Phoenix", 160, 200, 20, 30, 10),
+    ("Giant Spider", 70, 110, 9, 17, 4),
+    ("Slime King", 130, 170, 13, 21, 6),
+    ("Hydra", 180, 220, 22, 32, 11),
+    ("Dark Knight", 170, 210, 21, 29, 10)
+]
+
+SPECIAL_ABILITIES = {
+    "Vampire": "lifesteal",
+    "Wraith": "poison",
+    "Dark Knight": "double_strike",
+    "Lich": "lifesteal",
+    "Warlock": "burn",
+    "Werewolf": "double_strike",
+    "Basilisk": "freeze",
+    "Phoenix": "burn",
+    "Hydra": "poison"
+}
+
+# (name, health, attack, defense, gold, ability) before floor scaling
+BOSS_TYPES = (
+    ("Bone Tyrant", 250, 30, 12, 120, "lifesteal"),
+    ("Inferno Golem", 270, 35, 14, 140, "burn"),
+    ("Frost Warden", 260, 28, 13, 130, "freeze"),
+    ("Shadow Reaver", 280, 33, 15, 150, "poison"),
+    ("Doom Bringer", 300, 38, 16, 160, "double_strike"),
+    ("Void Serpent", 290, 36, 17, 155, "poison"),
+    ("Ember Lord", 295, 37, 16, 158, "burn"),
+    ("Glacier Fiend", 265, 29, 14, 133, "freeze"),
+    ("Grave Monarch", 275, 32, 15, 138, "lifesteal"),
+    ("Storm Reaper", 285, 34, 15, 145, "double_strike")
+)
+
+# Boss name -> Weapon arguments for each possible drop. Weapons are built when they drop.
+BOSS_LOOT = {
+    "Bone Tyrant": (("Skullcrusher", "A mace adorned with bone fragments.", 24, 32, 0),),
+    "Inferno Golem": (("Molten Blade", "Red-hot sword that scorches foes.", 26, 34, 0),),
+    "Frost Warden": (("Glacier Edge", "Chilling blade that slows enemies.", 23, 31, 0),),
+    "Shadow Reaver": (("Nightfang", "A dagger that thrives in shadows.", 22, 30, 0),),
+    "Doom Bringer": (("Cataclysm", "Heavy axe with devastating power.", 28, 36, 0),),
+    "Void Serpent": (("Venom Spire", "Spear coated in lethal toxins.", 24, 32, 0),),
+    "Ember Lord": (("Flame Lash", "Whip of living fire.", 25, 33, 0),),
+    "Glacier Fiend": (("Frozen Talon", "Ice-forged claw that freezes.", 24, 31, 0),),
+    "Grave Monarch": (("Cryptblade", "Blade of necrotic energy.", 25, 34, 0),),
+    "Storm Reaper": (("Thunder Cleaver", "Sword crackling with lightning.", 26, 35, 0),)
+}
+
+@lru_cache(maxsize=256)
+def floor_spawns(floor):
+    # The regular enemy spawn for a floor with its scaling already applied:
+    # (name, health range, attack range, defense, gold range, ability, count).
+    # Worked out the first time a floor number comes up and cached after that, so
+    # populate_floor only rolls inside the ranges.
+    if floor >= 14:
+        name, hp_min, hp_max, atk_min, atk_max, defense = ENEMY_TYPES[-1]
+    else:
+        idx = min((floor - 1) // 3, len(ENEMY_TYPES) - 2)
+        name, hp_min, hp_max, atk_min, atk_max, defense = ENEMY_TYPES[idx]
+
+    early_game_bonus = 5 if floor <= 3 else 0
+    hp_scale = 1 if floor <= 3 else 2
+    atk_scale = 1 if floor <= 3 else 2
+
+    return (name,
+            (hp_min + floor * hp_scale, hp_max + floor * hp_scale),
+            (atk_min + atk_scale, atk_max + atk_scale),
+            max(1, defense + floor // 3),
+            (15 + early_game_bonus + floor, 30 + floor * 2),
+            SPECIAL_ABILITIES.get(name),
+            5 + floor)
+
+# Floors of at least this many cells default to the binary_tree generator: prim takes
+# seconds there, binary_tree well under one. Its mazes lean north-west; pass
+# generator="prim" to keep the old look on a large map, and compact=True to also keep the
+# grid itself small.
+LARGE_FLOOR = 250_000
+
+def default_generator(width, height):
+    if width * height >= LARGE_FLOOR and np is not None:
+        return "binary_tree"
+    return "prim"  # binary_tree falls back to kruskal without NumPy, which is no faster
+
 class DungeonBase:
-    def __init__(self, width, height):
+    def __init__(self, width, height, policy=None, out=CONSOLE, generator=None, fill_ratio=0.5, compact=False,
+                 seed=None, validate=None):
         self.width = width
         self.height = height
-        self.rooms = [[None for _ in range(width)] for _ in range(height)]
-        self.room_names = [[self.generate_room_name() for _ in range(width)] for _ in range(height)]
+        self.generator = generator or default_generator(width, height)  # key into GENERATORS
+        self.fill_ratio = fill_ratio
+        self.compact = compact  # store rooms as CompactRooms instead of a list of lists
+        self.validate = validate  # None, "reachable" or "walkable": repair floors that fall short
+        self.floor_report = None  # validate_floor() of the current floor when validate is set
+        self.seed = seed if seed is not None else random.getrandbits(64)  # replays the whole game
+        self.rng = RandomStreams(self.seed)
+        self.policy = policy or HumanPolicy()
+        self.out = out
+        self.rooms = self.new_rooms()
+        self.room_names = self.new_room_names()
         self.visited_rooms = set()
         self.player = None
         self.exit_coords = None
+        self.floor = 1
+        self.turns = 0
+        self.outcome = None
+        self.floor_log = []  # (floor, gold, total xp, level, health) on entering each floor
+        self.save_path = None  # quitting writes a snapshot here when set
+        self.resuming = False  # set by restore_game: play_game picks up mid-floor
+        self.journal = None  # a Journal that checkpoints each floor and logs every turn
+        self.minimap = None  # a Minimap redrawn after every turn
+        self.pathfinder = Pathfinder(self)
+        self.entities = SpatialIndex()  # every object on the floor but the player, by (x, y)
         self.shop_items = [
             Item("Health Potion", "Restores 20 health"),
             Weapon("Sword", "A sharp sword", 10, 15, 40),
@@ -209,168 +1273,112 @@ class DungeonBase:
             Weapon("Flame Blade", "Glows with searing heat", 13, 20, 95)
         ]
 
-    def generate_room_name(self, room_type=None):
-        lore = {
-            "Treasure": ("Glittering Vault", "The air shimmers with unseen magic. Ancient riches may lie within."),
-            "Trap": ("Booby-Trapped Passage", "This corridor is riddled with pressure plates and crumbled bones."),
-            "Enemy": ("Cursed Hall", "The shadows shift... something watches from the dark."),
-            "Exit": ("Sealed Gate", "Massive stone doors sealed by arcane runes. It might be the only way out."),
-            "Key": ("Hidden Niche", "A hollow carved into the wall, forgotten by time. Something valuable glints inside."),
-            "Empty": ("Silent Chamber", "Dust covers everything. It appears long abandoned."),
-            "default": (None, None)
-        }
-
-        if room_type in lore:
-            return lore[room_type][0]
-
-        adjectives = [
-            "Collapsed", "Echoing", "Gloomy", "Withered", "Fungal", "Whispering", "Icy",
-            "Dust-choked", "Ancient", "Haunted", "Buried", "Broken", "Wretched", "Twisting"
-        ]
-        nouns = [
-            "Passage", "Fissure", "Grotto", "Vault", "Sanctum", "Shrine",
-            "Cellar", "Refuge", "Gallery", "Crypt", "Atrium", "Chapel", "Workshop", "Quarters"
-        ]
-        return f"{random.choice(adjectives)} {random.choice(nouns)}"
+    def index_entities(self):
+        # Rebuilds self.entities from the grid, for floors that were loaded instead of generated.
+        self.entities = SpatialIndex()
+        width = self.width
+        for i, room in grid_codes(self)[1].items():
+            if room is not self.player:
+                self.entities.add(room, (i % width, i // width))
+
+    def ask(self, site, prompt, **context):
+        # A generator: run() and the turn handlers yield each prompt to whoever drives the
+        # game (play_game's policy, or a server session) and resume with the answer.
+        self.out.flush()
+        answer = yield site, prompt, context
+        return answer
+
+    def new_rooms(self):
+        if self.compact:
+            return CompactRooms(self.width, self.height)
+        return [[None for _ in range(self.width)] for _ in range(self.height)]
+
+    def new_room_names(self, floor=1):
+        return RoomNames(self.width, self.height, self.seed, floor)
 
     def generate_dungeon(self, floor=1):
-        enchantment_rooms = ["Enchantment Chamber", "Alchemist's Forge"]
-        self.rooms = [[None for _ in range(self.width)] for _ in range(self.height)]
-        self.room_names = [[self.generate_room_name() for _ in range(self.width)] for _ in range(self.height)]
-        visited = set()
-        path = []
-        x, y = self.width // 2, self.height // 2
-        start = (x, y)
-        visited.add(start)
-        path.append(start)
-
-        while len(visited) < (self.width * self.height) // 2:
-            direction = random.choice([(1,0), (-1,0), (0,1), (0,-1)])
-            nx, ny = x + direction[0], y + direction[1]
-            if 0 <= nx < self.width and 0 <= ny < self.height:
-                if (nx, ny) not in visited:
-                    visited.add((nx, ny))
-                    path.append((nx, ny))
-                x, y = nx, ny
-
-        for (x, y) in visited:
-            self.rooms[y][x] = "Empty"
-
-        self.player = Player(input("Enter your name: "))
+        # With validate set, a floor repair_floor can't fix is thrown away and built again
+        # from the generation stream, up to FLOOR_ATTEMPTS times; the last one is kept.
+        for _ in range(FLOOR_ATTEMPTS):
+            boss, loot = self.build_floor(floor)
+            if not self.validate:
+                break
+            self.floor_report = validate_floor(self)
+            if not self.floor_report[self.validate]:
+                self.floor_report = repair_floor(self)
+            if self.floor_report[self.validate]:
+                break
+        self.out.emit("boss", boss=boss)
+        if loot:
+            self.out.emit("boss_drop", weapon=loot.name)
+
+    def build_floor(self, floor):
+        # Carves and fills one floor; returns the boss and its drop from populate_floor.
+        self.rooms = self.new_rooms()
+        self.room_names = self.new_room_names(floor)
+        self.entities = SpatialIndex()
+        start = (self.width // 2, self.height // 2)
+        target = max(1, int(self.width * self.height * self.fill_ratio))
+        visited = GENERATORS[self.generator](self.width, self.height, start, target, self.rng.generation)
+
+        width = self.width
+        if self.compact:
+            self.rooms.fill(visited, "Empty")
+        else:
+            for i in visited:
+                self.rooms[i // width][i % width] = "Empty"
+
+        # play_game names the player first; this covers direct, headless calls.
+        if self.player is None:
+            self.player = Player(self.policy.choose("name", "Enter your name: ", self), self.out, self.rng.combat)
         self.rooms[start[1]][start[0]] = self.player
         self.player.x, self.player.y = start
         self.visited_rooms.add(start)
 
-        visited.remove(start)
-        visited = list(visited)
-        random.shuffle(visited)
+        # Only 19 + floor cells get contents (exit, keys, enemies, boss, loot and the special
+        # rooms), so sample those rather than shuffling every carved cell. Index 0 is the
+        # start cell, which generators always return first.
+        picks = self.rng.generation.sample(range(1, len(visited)), min(len(visited) - 1, 19 + floor))
+        visited = [(visited[i] % width, visited[i] // width) for i in picks]
 
         def place(obj):
             if visited:
                 x, y = visited.pop()
                 self.rooms[y][x] = obj
+                if not isinstance(obj, str):
+                    self.entities.add(obj, (x, y))
                 return (x, y)
 
-        self.exit_coords = place("Exit")
-        place(Item("Key", "Opens the dungeon exit"))
-
-        enemy_types = [
-            ("Goblin", 40, 70, 5, 12, 2),
-            ("Skeleton", 60, 90, 7, 14, 3),
-            ("Orc", 80, 110, 10, 18, 4),
-            ("Wraith", 100, 140, 12, 22, 6),
-            ("Demon", 120, 160, 15, 26, 8),
-            ("Bandit", 50, 80, 6, 14, 3),
-            ("Cultist", 65, 95, 9, 16, 3),
-            ("Ghoul", 70, 100, 8, 15, 4),
-            ("Vampire", 90, 130, 10, 20, 5),
-            ("Troll", 110, 150, 13, 23, 6),
-            ("Lich", 130, 170, 14, 26, 7),
-            ("Minotaur", 140, 180, 16, 28, 8),
-            ("Harpy", 70, 110, 10, 18, 4),
-            ("Werewolf", 100, 140, 12, 20, 5),
-            ("Gargoyle", 90, 130, 10, 22, 6),
-            ("Basilisk", 120, 160, 14, 24, 7),
-            ("Shade", 80, 120, 11, 19, 4),
-            ("Warlock", 110, 150, 15, 25, 6),
-            ("Zombie", 60, 100, 6, 14, 3),
-            ("Revenant", 150, 190, 18, 28, 9),
-            ("Phoenix", 160, 200, 20, 30, 10),
-            ("Giant Spider", 70, 110, 9, 17, 4),
-            ("Slime King", 130, 170, 13, 21, 6),
-            ("Hydra", 180, 220, 22, 32, 11),
-            ("Dark Knight", 170, 210, 21, 29, 10)
-        ]
+        return self.populate_floor(floor, place, self.rng.generation)
+
+    def populate_floor(self, floor, place, rng, with_exit=True):
+        # Fills a floor through place(obj), which puts obj on a free carved cell and returns
+        # its (x, y). Every roll comes from rng, so a seeded rng gives the same contents.
+        # Returns the boss's name and the weapon it drops (or None) for the caller to announce.
+        if with_exit:
+            self.exit_coords = place("Exit")
+            place(Item("Key", "Opens the dungeon exit"))
+
+        name, health_range, attack_range, defense, gold_range, ability, count = floor_spawns(floor)
+        for _ in range(count):
+            health = rng.randint(*health_range)
+            attack = rng.randint(*attack_range)
+            gold = rng.randint(*gold_range)
 
-        early_game_bonus = 5 if floor <= 3 else 0
-        for _ in range(5 + floor):
-            if floor >= 14:
-                name, hp_min, hp_max, atk_min, atk_max, defense = enemy_types[-1]
-            else:
-                idx = min((floor - 1) // 3, len(enemy_types) - 2)
-                name, hp_min, hp_max, atk_min, atk_max, defense = enemy_types[idx]
-
-            hp_scale = 1 if floor <= 3 else 2
-            atk_scale = 1 if floor <= 3 else 2
-
-            defense = max(1, defense + floor // 3)
-
-            health = random.randint(hp_min + floor * hp_scale, hp_max + floor * hp_scale)
-            attack = random.randint(atk_min + atk_scale, atk_max + atk_scale)
-            gold = random.randint(15 + early_game_bonus + floor, 30 + floor * 2)
-
-            special_abilities = {
-                "Vampire": "lifesteal",
-                "Wraith": "poison",
-                "Dark Knight": "double_strike",
-                "Lich": "lifesteal",
-                "Warlock": "burn",
-                "Werewolf": "double_strike",
-                "Basilisk": "freeze",
-                "Phoenix": "burn",
-                "Hydra": "poison"
-            }
-            ability = special_abilities.get(name)
             enemy = Enemy(name, health, attack, defense, gold, ability)
             enemy.xp = max(5, (health + attack + defense) // 15)
 
             place(enemy)
 
-        boss_options = [
-                ("Bone Tyrant", 250, 30, 12, 120, "lifesteal"),
-                ("Inferno Golem", 270, 35, 14, 140, "burn"),
-                ("Frost Warden", 260, 28, 13, 130, "freeze"),
-                ("Shadow Reaver", 280, 33, 15, 150, "poison"),
-                ("Doom Bringer", 300, 38, 16, 160, "double_strike"),
-                ("Void Serpent", 290, 36, 17, 155, "poison"),
-                ("Ember Lord", 295, 37, 16, 158, "burn"),
-                ("Glacier Fiend", 265, 29, 14, 133, "freeze"),
-                ("Grave Monarch", 275, 32, 15, 138, "lifesteal"),
-                ("Storm Reaper", 285, 34, 15, 145, "double_strike")
-            ]
-        boss_choice = random.choice(boss_options)
-        name, hp, atk, dfs, gold, ability = boss_choice
-        print(f"A powerful boss guards this floor! The {name} lurks nearby...")
+        name, hp, atk, dfs, gold, ability = rng.choice(BOSS_TYPES)
         boss = Enemy(name, hp + floor * 10, atk + floor, dfs + floor // 2, gold + floor * 5, ability=ability)
         place(boss)
-        boss_loot_tables = {
-                "Bone Tyrant": [Weapon("Skullcrusher", "A mace adorned with bone fragments.", 24, 32, 0)],
-                "Inferno Golem": [Weapon("Molten Blade", "Red-hot sword that scorches foes.", 26, 34, 0)],
-                "Frost Warden": [Weapon("Glacier Edge", "Chilling blade that slows enemies.", 23, 31, 0)],
-                "Shadow Reaver": [Weapon("Nightfang", "A dagger that thrives in shadows.", 22, 30, 0)],
-                "Doom Bringer": [Weapon("Cataclysm", "Heavy axe with devastating power.", 28, 36, 0)],
-                "Void Serpent": [Weapon("Venom Spire", "Spear coated in lethal toxins.", 24, 32, 0)],
-                "Ember Lord": [Weapon("Flame Lash", "Whip of living fire.", 25, 33, 0)],
-                "Glacier Fiend": [Weapon("Frozen Talon", "Ice-forged claw that freezes.", 24, 31, 0)],
-                "Grave Monarch": [Weapon("Cryptblade", "Blade of necrotic energy.", 25, 34, 0)],
-                "Storm Reaper": [Weapon("Thunder Cleaver", "Sword crackling with lightning.", 26, 35, 0)]
-            }
-        boss_drop = boss_loot_tables.get(name, [])
-        if boss_drop and random.random() < 0.5:
-            loot = random.choice(boss_drop)
-            print(f"✨ The boss dropped a unique weapon: {loot.name}!")
+        boss_drop = BOSS_LOOT.get(name, ())
+        loot = None
+        if boss_drop and rng.random() < 0.5:
+            loot = Weapon(*rng.choice(boss_drop))  # a fresh weapon, since the player can enchant it
             place(loot)
-            
+
             place(Item("Key", "A magical key dropped by the boss"))
         for _ in range(3):
             place("Trap")
@@ -380,151 +1388,198 @@ class DungeonBase:
             place("Enchantment")
         place("Blacksmith")
         # Key is now tied to boss drop; don't place it separately
-
-    def play_game(self):
-        floor = 1
-        while (self.player is None or self.player.is_alive()) and floor <= 18:
-            print(f"===== Entering Floor {floor} =====")
-            self.generate_dungeon(floor)
+        return name, loot
+
+    def play_game(self, max_turns=None):
+        try:
+            self.resolve(self.run(max_turns))
+        finally:
+            self.out.flush()
+
+    def resolve(self, steps):
+        # Drives a prompting generator (run, move_player, battle, ...) to the end with the
+        # game's policy answering, and returns its result.
+        answer = None
+        try:
+            while True:
+                site, prompt, context = steps.send(answer)
+                answer = self.policy.choose(site, prompt, self, **context)
+        except StopIteration as stop:
+            return stop.value
+
+    def run(self, max_turns=None):
+        # The game as a generator of (site, prompt, context) requests, each sent back its answer.
+        # max_turns caps the number of actions for headless runs whose policy never finishes a floor.
+        floor = self.floor
+        while (self.player is None or self.player.is_alive()) and floor <= MAX_FLOOR:
+            self.floor = floor
+            if self.resuming:
+                self.resuming = False  # the snapshot already holds this floor
+            else:
+                self.out.emit("floor", floor=floor)
+                # The player carries over between floors; only the first floor asks for a name.
+                if self.player is None:
+                    self.player = Player((yield from self.ask("name", "Enter your name: ")), self.out, self.rng.combat)
+                self.generate_dungeon(floor)
+                player = self.player
+                total_xp = 10 * player.level * (player.level - 1) + player.xp
+                self.floor_log.append((floor, player.gold, total_xp, player.level, player.health))
+            if self.journal:
+                self.journal.checkpoint(self)
+            if self.minimap:
+                self.minimap.draw()
 
             while self.player.is_alive():
-                print(f"Position: ({self.player.x}, {self.player.y}) - {self.room_names[self.player.y][self.player.x]}")
-                print(f"Health: {self.player.health} | XP: {self.player.xp} | Gold: {self.player.gold} | Level: {self.player.level} | Floor: {floor}")
-                print("1. Move Left 2. Move Right 3. Move Up 4. Move Down 5. Visit Shop 6. Inventory 7. Quit")
-                choice = input("Action: ")
-
-                if choice == "1": self.move_player("left")
-                elif choice == "2": self.move_player("right")
-                elif choice == "3": self.move_player("up")
-                elif choice == "4": self.move_player("down")
-                elif choice == "5": self.shop()
-                elif choice == "6": self.show_inventory()
-                elif choice == "7": print("Thanks for playing!"); return
-                else: print("Invalid choice!")
+                if max_turns is not None and self.turns >= max_turns:
+                    self.outcome = "stalled"
+                    return
+                self.turns += 1
+                start = (self.player.x, self.player.y)
+                self.out.emit("status", x=self.player.x, y=self.player.y, room=self.room_names[self.player.y][self.player.x],
+                              health=self.player.health, xp=self.player.xp, gold=self.player.gold, level=self.player.level, floor=floor)
+                choice = yield from self.ask("action", "1. Move Left 2. Move Right 3. Move Up 4. Move Down 5. Visit Shop 6. Inventory 7. Quit\nAction: ")
+
+                if choice == "1": yield from self.move_player("left")
+                elif choice == "2": yield from self.move_player("right")
+                elif choice == "3": yield from self.move_player("up")
+                elif choice == "4": yield from self.move_player("down")
+                elif choice == "5": yield from self.shop()
+                elif choice == "6": yield from self.show_inventory()
+                elif choice == "7":
+                    if self.save_path:
+                        save_game(self, self.save_path)
+                        self.out.emit("saved", path=self.save_path)
+                    self.out.emit("quit")
+                    self.outcome = "quit"
+                    return
+                else: self.out.emit("invalid_choice")
 
                 if self.player.level >= 5 and self.player.health < self.player.max_health:
                     self.player.health += 1
-
-                if self.player.x == self.exit_coords[0] and self.player.y == self.exit_coords[1] and self.player.has_item("Key"):
-                    print("You reach the Sealed Gate.")
-                    proceed = input("Would you like to descend to the next floor? (y/n): ").lower()
+                if self.journal:
+                    self.journal.record(self, start)
+                if self.minimap:
+                    self.minimap.draw()
+
+                if self.exit_coords and self.player.x == self.exit_coords[0] and self.player.y == self.exit_coords[1] and self.player.has_item("Key"):
+                    self.out.emit("gate")
+                    proceed = (yield from self.ask("descend", "Would you like to descend to the next floor? (y/n): ")).lower()
                     if proceed == "y":
                         floor += 1
                         break
                     else:
-                        print("You chose to exit the dungeon.")
-                        print(f"Final Score: {self.player.get_score()}")
+                        self.out.emit("leave_dungeon")
+                        self.out.emit("final_score", score=self.player.get_score())
+                        self.outcome = "escaped"
                         return
 
-        print("You have died. Game Over!")
-        print(f"Final Score: {self.player.get_score()}")
+        if self.player.is_alive():
+            self.out.emit("completed")
+            self.outcome = "completed"
+        else:
+            self.out.emit("died")
+            self.outcome = "died"
+        self.out.emit("final_score", score=self.player.get_score())
 
     def move_player(self, direction):
         dx, dy = {"left": (-1,0), "right": (1,0), "up": (0,-1), "down": (0,1)}.get(direction, (0,0))
         x, y = self.player.x + dx, self.player.y + dy
         if 0 <= x < self.width and 0 <= y < self.height and self.rooms[y][x] is not None:
-            self.handle_room(x, y)
+            yield from self.handle_room(x, y)
         else:
-            print("You can't move that way.")
+            self.out.emit("blocked")
 
     def handle_room(self, x, y):
         room = self.rooms[y][x]
         name = self.room_names[y][x]
-        lore = {
-            "Glittering Vault": "The air shimmers with unseen magic. Ancient riches may lie within.",
-            "Booby-Trapped Passage": "This corridor is riddled with pressure plates and crumbled bones.",
-            "Cursed Hall": "The shadows shift... something watches from the dark.",
-            "Sealed Gate": "Massive stone doors sealed by arcane runes. It might be the only way out.",
-            "Hidden Niche": "A hollow carved into the wall, forgotten by time. Something valuable glints inside.",
-            "Silent Chamber": "Dust covers everything. It appears long abandoned."
-        }
-        if name in lore:
-            print(f"{lore[name]}")
+        if name in LORE_TEXT:
+            self.out.emit("lore", text=LORE_TEXT[name])
 
         if isinstance(room, Enemy):
-            self.battle(room)
+            yield from self.battle(room)
             if not room.is_alive():
                 self.rooms[y][x] = None
         elif isinstance(room, Item):
-            print(f"You found a {room.name}!")
+            self.out.emit("found_item", item=room.name)
             self.player.collect_item(room)
             self.rooms[y][x] = None
             if room.name == "Key":
                 self.room_names[y][x] = "Hidden Niche"
         elif room == "Treasure":
-            gold = random.randint(20, 50)
+            gold = self.rng.loot.randint(20, 50)
             self.player.gold += gold
-            print(f"You found a treasure chest with {gold} gold!")
+            self.out.emit("treasure", gold=gold)
             self.rooms[y][x] = None
             self.room_names[y][x] = "Glittering Vault"
         elif room == "Enchantment":
-            print("You enter a glowing chamber with ancient runes etched in the stone.")
+            self.out.emit("enchant_intro")
             if self.player.weapon:
-                print(f"Your current weapon is: {self.player.weapon.name}")
-                print("You may enchant it with a status effect for 30 gold.")
-                print("1. Poison  2. Burn  3. Freeze  4. Cancel")
-                choice = input("Choose enchantment: ")
+                self.out.emit("enchant_offer", weapon=self.player.weapon.name)
+                choice = yield from self.ask("enchant", "1. Poison  2. Burn  3. Freeze  4. Cancel\nChoose enchantment: ")
                 if self.player.weapon.effect:
-                    print("Your weapon is already enchanted! You can't add another enchantment.")
+                    self.out.emit("enchant_already")
                 elif self.player.gold >= 30 and choice in ["1", "2", "3"]:
                     effect = {"1": "poison", "2": "burn", "3": "freeze"}[choice]
                     self.player.weapon.description += f" (Enchanted: {effect})"
                     self.player.weapon.effect = effect
                     self.player.gold -= 30
-                    print(f"Your weapon is now enchanted with {effect}!")
+                    self.out.emit("enchanted", effect=effect)
                 elif choice == "4":
-                    print("You leave the enchantment chamber untouched.")
+                    self.out.emit("enchant_cancel")
                 else:
-                    print("Not enough gold or invalid choice.")
+                    self.out.emit("enchant_fail")
             else:
-                print("You need a weapon to enchant.")
+                self.out.emit("enchant_no_weapon")
             self.rooms[y][x] = None
             self.room_names[y][x] = "Enchantment Chamber"
         elif room == "Blacksmith":
-            print("You meet a grizzled blacksmith hammering at a forge.")
+            self.out.emit("blacksmith_intro")
             if self.player.weapon:
-                print(f"Your weapon: {self.player.weapon.name} ({self.player.weapon.min_damage}-{self.player.weapon.max_damage})")
-                print("Would you like to upgrade your weapon for 50 gold? +3 min/max damage")
-                confirm = input("Upgrade? (y/n): ")
+                self.out.emit("blacksmith_offer", weapon=self.player.weapon.name,
+                              min_damage=self.player.weapon.min_damage, max_damage=self.player.weapon.max_damage)
+                confirm = yield from self.ask("blacksmith", "Upgrade? (y/n): ")
                 if confirm.lower() == "y" and self.player.gold >= 50:
                     self.player.weapon.min_damage += 3
                     self.player.weapon.max_damage += 3
                     self.player.gold -= 50
-                    print("Your weapon has been reforged and is stronger!")
+                    self.out.emit("upgraded")
                 elif self.player.gold < 50:
-                    print("You don't have enough gold.")
+                    self.out.emit("no_gold")
                 else:
-                    print("Maybe next time.")
+                    self.out.emit("upgrade_declined")
             else:
-                print("The blacksmith scoffs. 'No weapon? Come back when you have something worth forging.'")
+                self.out.emit("blacksmith_scoff")
             self.rooms[y][x] = None
             self.room_names[y][x] = "Blacksmith Forge"
 
         elif room == "Trap":
-            damage = random.randint(10, 30)
+            damage = self.rng.combat.randint(10, 30)
+            self.player.last_damage_source = "Trap"
             self.player.take_damage(damage)
-            print(f"It's a trap! You took {damage} damage.")
+            self.out.emit("trap", damage=damage)
             self.rooms[y][x] = None
             self.room_names[y][x] = "Booby-Trapped Passage"
         elif room == "Exit":
             self.room_names[y][x] = "Sealed Gate"
+            # Unlocking hands over to play_game, which offers to descend or leave.
             if self.player.has_item("Key"):
-                print("🎉 You unlocked the exit and escaped the dungeon!")
-                print(f"Final Score: {self.player.get_score()}")
-                exit()
+                self.out.emit("exit_unlocked")
             else:
-                print("The exit is locked. You need a key!")
+                self.out.emit("exit_locked")
 
+        if not isinstance(room, str):
+            self.entities.remove(room, (x, y))  # taken, beaten, or (if the fight stalled) trampled
         self.rooms[self.player.y][self.player.x] = None
+        self.pathfinder.block(self.player.x, self.player.y)
         self.player.x, self.player.y = x, y
         self.rooms[y][x] = self.player
         self.visited_rooms.add((x, y))
 
     def battle(self, enemy):
-        print(f"You encountered a {enemy.name}! {enemy.ability.capitalize() if enemy.ability else ''} Boss incoming!")
+        self.out.emit("encounter", enemy=enemy.name, ability=enemy.ability.capitalize() if enemy.ability else '')
         self.player.apply_status_effects()
         if 'freeze' in self.player.status_effects:
-            print("\u2744\ufe0f You are frozen and skip this turn!")
+            self.out.emit("frozen_skip")
             self.player.status_effects['freeze'] -= 1
             if self.player.status_effects['freeze'] <= 0:
                 del self.player.status_effects['freeze']
@@ -533,10 +1588,8 @@ class DungeonBase:
             return
 
         while self.player.is_alive() and enemy.is_alive():
-            print(f"Player Health: {self.player.health}")
-            print(f"Enemy Health: {enemy.health}")
-            print("1. Attack\n2. Defend\n3. Use Health Potion")
-            choice = input("Choose action: ")
+            self.out.emit("battle_round", player_health=self.player.health, enemy_health=enemy.health)
+            choice = yield from self.ask("battle", "1. Attack\n2. Defend\n3. Use Health Potion\nChoose action: ", enemy=enemy)
             if choice == "1":
                 self.player.attack(enemy)
                 if enemy.is_alive():
@@ -550,17 +1603,17 @@ class DungeonBase:
                 if enemy.is_alive():
                     enemy.attack(self.player)
             else:
-                print("Invalid choice!")
+                self.out.emit("invalid_choice")
 
     def shop(self):
-        print("Welcome to the Shop!")
-        print(f"Gold: {self.player.gold}")
+        self.out.emit("shop_open", gold=self.player.gold)
+        lines = []
         for i, item in enumerate(self.shop_items, 1):
             price = item.price if isinstance(item, Weapon) else 10
-            print(f"{i}. {item.name} - {price} Gold")
-        print(f"{len(self.shop_items)+1}. Exit")
+            lines.append(f"{i}. {item.name} - {price} Gold\n")
+        lines.append(f"{len(self.shop_items)+1}. Exit\n")
 
-        choice = input("Buy what?")
+        choice = yield from self.ask("shop", "".join(lines) + "Buy what?")
         if choice.isdigit():
             choice = int(choice)
             if 1 <= choice <= len(self.shop_items):
@@ -569,27 +1622,27 @@ class DungeonBase:
                 if self.player.gold >= price:
                     self.player.collect_item(item)
                     self.player.gold -= price
-                    print(f"You bought {item.name}.")
+                    self.out.emit("bought", item=item.name)
                 else:
-                    print("Not enough gold.")
+                    self.out.emit("not_enough_gold")
             elif choice == len(self.shop_items) + 1:
-                print("Leaving the shop.")
+                self.out.emit("leave_shop")
             else:
-                print("Invalid choice.")
+                self.out.emit("shop_invalid_choice")
         else:
-            print("Invalid input.")
+            self.out.emit("shop_invalid_input")
 
     def show_inventory(self):
         if not self.player.inventory:
-            print("Your inventory is empty.")
+            self.out.emit("inventory_empty")
             return
 
-        print("Your Inventory:")
+        lines = ["Your Inventory:\n"]
         for i, item in enumerate(self.player.inventory, 1):
             equipped = " (Equipped)" if item == self.player.weapon else ""
-            print(f"{i}. {item.name}{equipped} - {item.description}")
+            lines.append(f"{i}. {item.name}{equipped} - {item.description}\n")
 
-        choice = input("Enter item number to equip weapon, or press Enter to go back: ")
+        choice = yield from self.ask("inventory", "".join(lines) + "Enter item number to equip weapon, or press Enter to go back: ")
         if choice.isdigit():
             idx = int(choice) - 1
             if 0 <= idx < len(self.player.inventory):
@@ -597,10 +1650,1463 @@ class DungeonBase:
                 if isinstance(item, Weapon):
                     self.player.equip_weapon(item)
                 else:
-                    print("You can only equip weapons.")
+                    self.out.emit("only_weapons")
             else:
-                print("Invalid selection.")
+                self.out.emit("invalid_selection")
+
+    def summary(self):
+        player = self.player
+        return {
+            "seed": self.seed,
+            "outcome": self.outcome,
+            "floor": self.floor,
+            "turns": self.turns,
+            "score": player.get_score() if player else 0,
+            "level": player.level if player else 1,
+            "gold": player.gold if player else 0,
+            "xp": player.xp if player else 0,
+            "death_cause": player.last_damage_source if self.outcome == "died" else None,
+            "floors": list(self.floor_log),
+        }
+
+# --- Save Snapshots ---
+
+# A snapshot is a fixed header followed by three length-prefixed sections:
+#   grid     zlib'd ROOM_CODES bytes, one per cell (ENTITY where an object stands)
+#   visited  zlib'd array of the visited cell indices, little-endian unsigned 64-bit
+#   state    pickle of everything else: player, cell objects, renamed rooms, rng streams...
+# The player's output is not saved; restore_game plugs in the one it is given.
+# Bump SAVE_VERSION whenever the layout changes.
+SAVE_MAGIC = b"MZ3S"
+SAVE_VERSION = 1
+SAVE_HEADER = struct.Struct("<4sHIIB")  # magic, version, width, height, compact
+SAVE_SECTION = struct.Struct("<Q")
+
+class _SnapshotPickler(pickle.Pickler):
+    # Pickles the objects in shared ({name: obj}) by name only; the unpickler is handed
+    # the live objects to put back in their place.
+    def __init__(self, file, shared):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.names = {id(obj): name for name, obj in shared.items()}
+
+    def persistent_id(self, obj):
+        return self.names.get(id(obj))
+
+class _SnapshotUnpickler(pickle.Unpickler):
+    def __init__(self, file, shared):
+        super().__init__(file)
+        self.shared = shared
+
+    def persistent_load(self, pid):
+        if pid not in self.shared:
+            raise pickle.UnpicklingError(f"unknown snapshot reference {pid!r}")
+        return self.shared[pid]
+
+def grid_codes(game):
+    # (ROOM_CODES buffer, {cell index: object}) for a game's grid. Compact grids are handed
+    # over as they are; list grids are encoded cell by cell.
+    if isinstance(game.rooms, CompactRooms):
+        return game.rooms.codes, game.rooms.entities
+    if not isinstance(game.rooms, list):
+        raise TypeError("only DungeonBase grids can be saved; streaming worlds spill their own chunks")
+    codes, entities = bytearray(game.width * game.height), {}
+    i = 0
+    for row in game.rooms:
+        for room in row:
+            if room is None or isinstance(room, str):
+                codes[i] = ROOM_CODE_OF[room]
+            else:
+                codes[i] = ENTITY
+                entities[i] = room
+            i += 1
+    return codes, entities
+
+def snapshot_game(game):
+    # The whole state of a DungeonBase as bytes.
+    width, height = game.width, game.height
+    codes, entities = grid_codes(game)
+
+    visited = array("Q", sorted(y * width + x for x, y in game.visited_rooms))
+    if sys.byteorder == "big":
+        visited.byteswap()
+
+    state = {
+        "generator": game.generator, "fill_ratio": game.fill_ratio, "seed": game.seed, "rng": game.rng,
+        "validate": game.validate, "policy": game.policy, "player": game.player, "entities": entities, "exit_coords": game.exit_coords,
+        "names_floor": game.room_names.floor, "renamed": game.room_names.renamed,
+        "floor": game.floor, "turns": game.turns, "outcome": game.outcome, "floor_log": game.floor_log,
+        "shop_items": game.shop_items,
+    }
+    buffer = io.BytesIO()
+    _SnapshotPickler(buffer, {"out": game.out}).dump(state)
+
+    parts = [SAVE_HEADER.pack(SAVE_MAGIC, SAVE_VERSION, width, height, game.compact)]
+    for section in (zlib.compress(codes, 1), zlib.compress(visited, 1), buffer.getvalue()):
+        parts.append(SAVE_SECTION.pack(len(section)))
+        parts.append(section)
+    return b"".join(parts)
+
+def restore_game(data, policy=None, out=CONSOLE):
+    # Rebuilds a DungeonBase from snapshot_game bytes. play_game then carries on from the
+    # saved turn. policy replaces the saved policy when given.
+    view = memoryview(data)
+    magic, version, width, height, compact = SAVE_HEADER.unpack_from(view)
+    if magic != SAVE_MAGIC:
+        raise ValueError("not a maze save file")
+    if version != SAVE_VERSION:
+        raise ValueError(f"unsupported save version {version} (this game reads version {SAVE_VERSION})")
+    offset, sections = SAVE_HEADER.size, []
+    for _ in range(3):
+        (length,) = SAVE_SECTION.unpack_from(view, offset)
+        offset += SAVE_SECTION.size
+        sections.append(view[offset:offset + length])
+        offset += length
+    codes = bytearray(zlib.decompress(sections[0]))
+    visited = array("Q", zlib.decompress(sections[1]))
+    if sys.byteorder == "big":
+        visited.byteswap()
+    state = _SnapshotUnpickler(io.BytesIO(sections[2]), {"out": out}).load()
+
+    game = DungeonBase(width, height, policy or state["policy"], out, state["generator"], state["fill_ratio"],
+                       bool(compact), state["seed"], state.get("validate"))
+    entities = state["entities"]
+    if compact:
+        game.rooms.codes = codes
+        game.rooms.entities = entities
+    else:
+        rooms, kinds = game.rooms, ROOM_CODES + [None]  # ENTITY cells are filled in below
+        for y in range(height):
+            rooms[y] = [kinds[code] for code in codes[y * width:(y + 1) * width]]
+        for i, room in entities.items():
+            rooms[i // width][i % width] = room
+
+    game.room_names = game.new_room_names(state["names_floor"])
+    game.room_names.renamed = state["renamed"]
+    game.visited_rooms.update((i % width, i // width) for i in visited)
+
+    game.rng = state["rng"]
+    game.player = state["player"]
+    for key in ("exit_coords", "floor", "turns", "outcome", "floor_log", "shop_items"):
+        setattr(game, key, state[key])
+    game.resuming = game.player is not None and game.outcome is None
+    game.index_entities()
+    return game
+
+def save_game(game, path):
+    # Written to a temporary file first, so a crash mid-save never leaves a torn snapshot.
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as file:
+            file.write(snapshot_game(game))
+        os.replace(temp, path)
+    except BaseException:
+        os.unlink(temp)
+        raise
+
+def load_game(path, policy=None, out=CONSOLE):
+    with open(path, "rb") as file:
+        return restore_game(file.read(), policy, out)
+
+# --- Turn Journal ---
+
+# Appending a few hundred bytes per turn is far cheaper than rewriting a snapshot of a
+# large grid. The journal file is a header binding it to one snapshot (the CRC32 of its
+# bytes) and then one record per turn: "<II" length and CRC32, then a pickle of what the
+# turn can change. A turn only touches the cell the player left, the cell they entered
+# (and its name and visited mark). The player and shop items go in whole since they share
+# objects; the rng streams are referenced by name, and a stream's state is only written
+# on turns that drew from it. The policy comes from the snapshot and is only written
+# again on a turn where the game was handed a different one, so a bot's own rng is back
+# at its checkpoint state after recovery. A torn or corrupt tail is ignored on recovery.
+JOURNAL_MAGIC = b"MZ3J"
+JOURNAL_VERSION = 1
+JOURNAL_HEADER = struct.Struct("<4sHI")  # magic, version, snapshot CRC32
+JOURNAL_RECORD = struct.Struct("<II")
+
+class Journal:
+    def __init__(self, snapshot_path, journal_path=None, sync=False):
+        self.snapshot_path = snapshot_path
+        self.journal_path = journal_path or snapshot_path + ".journal"
+        self.sync = sync  # fsync every record, not just flush it
+        self.file = None
+        self.states = {}  # rng stream name -> state as of the last record
+        self.policy = None  # the policy in the snapshot or the last record that had one
+
+    def checkpoint(self, game):
+        # A fresh snapshot, then an empty journal bound to it. If this is interrupted
+        # between the two, the old journal no longer matches and recovery skips it.
+        data = snapshot_game(game)
+        directory = os.path.dirname(os.path.abspath(self.snapshot_path))
+        fd, temp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                file.write(data)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(temp, self.snapshot_path)
+        except BaseException:
+            os.unlink(temp)
+            raise
+        self.close()
+        self.file = open(self.journal_path, "wb")
+        self.file.write(JOURNAL_HEADER.pack(JOURNAL_MAGIC, JOURNAL_VERSION, zlib.crc32(data)))
+        self.flush()
+        self.states = {name: getattr(game.rng, name).getstate() for name in RandomStreams.NAMES}
+        self.policy = game.policy
+
+    def record(self, game, start):
+        width = game.width
+        x, y = game.player.x, game.player.y
+        cells = {}
+        for cx, cy in (start, (x, y)):
+            cells[cy * width + cx] = game.rooms[cy][cx]
+        here = y * width + x
+        streams = {}
+        for name in RandomStreams.NAMES:
+            state = getattr(game.rng, name).getstate()
+            if state != self.states.get(name):
+                streams[name] = self.states[name] = state
+        policy = None
+        if game.policy is not self.policy:
+            policy = self.policy = game.policy
+        delta = {
+            "cells": cells, "visited": (x, y) if (x, y) in game.visited_rooms else None,
+            "renamed": game.room_names.renamed.get(here), "here": here,
+            "player": game.player, "shop_items": game.shop_items, "streams": streams, "policy": policy,
+            "turns": game.turns, "outcome": game.outcome,
+        }
+        buffer = io.BytesIO()
+        _SnapshotPickler(buffer, journal_shared(game)).dump(delta)
+        payload = buffer.getvalue()
+        self.file.write(JOURNAL_RECORD.pack(len(payload), zlib.crc32(payload)))
+        self.file.write(payload)
+        self.flush()
+
+    def flush(self):
+        self.file.flush()
+        if self.sync:
+            os.fsync(self.file.fileno())
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+def journal_shared(game):
+    shared = {name: getattr(game.rng, name) for name in RandomStreams.NAMES}
+    shared["out"] = game.out
+    return shared
+
+def replay_journal(game, data, keep_policy=False):
+    # Applies journal bytes to a game restored from the snapshot they belong to and
+    # returns how many turns were replayed. Stops at the first torn or corrupt record.
+    # keep_policy leaves the game's policy alone instead of taking a journaled one.
+    width, offset, replayed = game.width, JOURNAL_HEADER.size, 0
+    shared = journal_shared(game)
+    while offset + JOURNAL_RECORD.size <= len(data):
+        length, crc = JOURNAL_RECORD.unpack_from(data, offset)
+        payload = data[offset + JOURNAL_RECORD.size:offset + JOURNAL_RECORD.size + length]
+        if len(payload) < length or zlib.crc32(payload) != crc:
+            break
+        delta = _SnapshotUnpickler(io.BytesIO(payload), shared).load()
+        for i, room in delta["cells"].items():
+            game.rooms[i // width][i % width] = room
+        if delta["visited"]:
+            game.visited_rooms.add(delta["visited"])
+        if delta["renamed"] is not None:
+            game.room_names.renamed[delta["here"]] = delta["renamed"]
+        for name, state in delta["streams"].items():
+            getattr(game.rng, name).setstate(state)
+        for key in ("player", "shop_items", "turns", "outcome"):
+            setattr(game, key, delta[key])
+        if delta["policy"] is not None and not keep_policy:
+            game.policy = delta["policy"]
+        offset += JOURNAL_RECORD.size + length
+        replayed += 1
+    game.resuming = game.player is not None and game.outcome is None
+    game.index_entities()
+    return replayed
+
+def recover_game(snapshot_path, journal_path=None, policy=None, out=CONSOLE):
+    # The last snapshot plus every whole journal record written after it.
+    with open(snapshot_path, "rb") as file:
+        data = file.read()
+    game = restore_game(data, policy, out)
+    journal_path = journal_path or snapshot_path + ".journal"
+    if os.path.exists(journal_path):
+        with open(journal_path, "rb") as file:
+            journal = file.read()
+        if len(journal) >= JOURNAL_HEADER.size:
+            magic, version, crc = JOURNAL_HEADER.unpack_from(journal)
+            if magic == JOURNAL_MAGIC and version == JOURNAL_VERSION and crc == zlib.crc32(data):
+                replay_journal(game, journal, keep_policy=policy is not None)
+    return game
+
+# --- Streaming World ---
+
+WORLD_SIZE = 1 << 32  # side of the streaming world; the player starts in the middle
+
+class Chunk:
+    def __init__(self, codes, entities, renamed=None, visited=None):
+        self.codes = codes          # bytearray of ROOM_CODES, like CompactRooms
+        self.entities = entities    # local index -> object
+        self.renamed = renamed or {}
+        self.visited = visited or set()
+        self.dirty = False          # changed since it was generated or last spilled
+
+class ChunkedWorld:
+    # Splits an endless floor into chunk_size x chunk_size chunks. A chunk is generated
+    # from (seed, chunk x, chunk y) the first time anything looks at it, and at most
+    # `capacity` chunks stay in memory: the least recently used ones outside `radius`
+    # chunks of the player are dropped, or pickled to spill_dir if the player changed them.
+    def __init__(self, dungeon, chunk_size=64, radius=1, capacity=None, spill_dir=None):
+        self.dungeon = dungeon
+        self.size = chunk_size
+        self.radius = radius
+        self.capacity = capacity or (2 * radius + 3) ** 2
+        self.owns_spill_dir = spill_dir is None
+        self.spill_dir = spill_dir  # a temporary one is made on the first spill
+        self.chunks = OrderedDict()
+        self.focus = (0, 0)
+        self.origin = (WORLD_SIZE // 2) // chunk_size
+
+    def chunk(self, cx, cy):
+        key = (cx, cy)
+        chunk = self.chunks.get(key)
+        if chunk is None:
+            chunk = self.load(cx, cy) or self.generate(cx, cy)
+            self.chunks[key] = chunk
+            self.index(key, chunk, self.dungeon.entities.add)
+            self.evict()
+        else:
+            self.chunks.move_to_end(key)
+        return chunk
+
+    def locate(self, x, y):
+        chunk = self.chunk(x // self.size, y // self.size)
+        return chunk, (y % self.size) * self.size + x % self.size
+
+    def center_on(self, x, y):
+        self.focus = (x // self.size, y // self.size)
+        fx, fy = self.focus
+        for cy in range(fy - self.radius, fy + self.radius + 1):
+            for cx in range(fx - self.radius, fx + self.radius + 1):
+                self.chunk(cx, cy)
+
+    def evict(self):
+        fx, fy = self.focus
+        for key in list(self.chunks):
+            if len(self.chunks) <= self.capacity:
+                break
+            if max(abs(key[0] - fx), abs(key[1] - fy)) <= self.radius:
+                continue
+            chunk = self.chunks.pop(key)
+            self.index(key, chunk, self.dungeon.entities.remove)
+            if chunk.dirty:
+                if self.spill_dir is None:
+                    self.spill_dir = tempfile.mkdtemp(prefix="maze-chunks-")
+                with open(self.spill_path(*key), "wb") as file:
+                    pickle.dump((chunk.codes, chunk.entities, chunk.renamed, chunk.visited), file)
+
+    def index(self, key, chunk, update):
+        # The dungeon's entity index only covers the chunks in memory.
+        size, player = self.size, self.dungeon.player
+        for i, obj in chunk.entities.items():
+            if obj is not player:
+                update(obj, (key[0] * size + i % size, key[1] * size + i // size))
+
+    def spill_path(self, cx, cy):
+        return os.path.join(self.spill_dir, f"{cx}_{cy}.chunk")
+
+    def load(self, cx, cy):
+        if self.spill_dir is None:
+            return None
+        path = self.spill_path(cx, cy)
+        if not os.path.exists(path):
+            return None
+        with open(path, "rb") as file:
+            return Chunk(*pickle.load(file))
+
+    def generate(self, cx, cy):
+        size = self.size
+        rng = random.Random(mix64((self.dungeon.seed ^ cx * 0x9E3779B97F4A7C15 ^ cy * 0xC2B2AE3D27D4EB4F) & MASK64))
+        centre = size // 2
+        target = max(1, int(size * size * self.dungeon.fill_ratio))
+        carved = GENERATORS[self.dungeon.generator](size, size, (centre, centre), target, rng)
+        codes = bytearray(size * size)
+        for i in carved:
+            codes[i] = ROOM_CODE_OF["Empty"]
+        # A corridor cross through the centre reaches the middle of every edge, where it
+        # meets the neighbouring chunk's cross, so the whole world stays connected.
+        for k in range(size):
+            codes[centre * size + k] = codes[k * size + centre] = ROOM_CODE_OF["Empty"]
+        chunk = Chunk(codes, {})
+
+        # Chunks further from the starting one play like deeper floors.
+        floor = min(MAX_FLOOR, 1 + max(abs(cx - self.origin), abs(cy - self.origin)))
+        free = [i for i in carved if i != centre * size + centre]
+        spots = rng.sample(free, min(len(free), 19 + floor))
+
+        def place(obj):
+            if spots:
+                i = spots.pop()
+                if isinstance(obj, str):
+                    codes[i] = ROOM_CODE_OF[obj]
+                else:
+                    codes[i] = ENTITY
+                    chunk.entities[i] = obj
+                return (cx * size + i % size, cy * size + i // size)
+
+        self.dungeon.populate_floor(floor, place, rng, with_exit=False)  # chunk bosses go unannounced
+        return chunk
+
+    def close(self):
+        if self.owns_spill_dir and self.spill_dir is not None:
+            shutil.rmtree(self.spill_dir, ignore_errors=True)
+            self.spill_dir = None
+
+class ChunkedRooms(FlatGrid):
+    def __init__(self, world):
+        self.world = world
+        self.width = self.height = WORLD_SIZE
+
+    def get(self, i):
+        chunk, local = self.world.locate(i % WORLD_SIZE, i // WORLD_SIZE)
+        code = chunk.codes[local]
+        if code == ENTITY:
+            return chunk.entities[local]
+        return ROOM_CODES[code]
+
+    def set(self, i, value):
+        chunk, local = self.world.locate(i % WORLD_SIZE, i // WORLD_SIZE)
+        chunk.dirty = True
+        if value is None or isinstance(value, str):
+            chunk.codes[local] = ROOM_CODE_OF[value]
+            chunk.entities.pop(local, None)
+        else:
+            chunk.codes[local] = ENTITY
+            chunk.entities[local] = value
+
+class ChunkedNames(FlatGrid):
+    def __init__(self, world, seed, floor):
+        self.world = world
+        self.width = self.height = WORLD_SIZE
+        self.seed = seed
+        self.floor = floor
+
+    def get(self, i):
+        x, y = i % WORLD_SIZE, i // WORLD_SIZE
+        chunk, local = self.world.locate(x, y)
+        return chunk.renamed.get(local) or room_name(self.seed, self.floor, x, y)
+
+    def set(self, i, name):
+        chunk, local = self.world.locate(i % WORLD_SIZE, i // WORLD_SIZE)
+        chunk.dirty = True
+        chunk.renamed[local] = name
+
+class ChunkedVisited:
+    # Stands in for the visited_rooms set, keeping each chunk's visits with the chunk.
+    def __init__(self, world):
+        self.world = world
+
+    def add(self, cell):
+        chunk, local = self.world.locate(*cell)
+        chunk.dirty = True
+        chunk.visited.add(local)
+
+    def __contains__(self, cell):
+        chunk, local = self.world.locate(*cell)
+        return local in chunk.visited
+
+class StreamingDungeon(DungeonBase):
+    # An endless floor with no exit: the world is streamed in chunks around the player and
+    # memory stays flat however far they walk. Play ends on death, quitting or max_turns.
+    def __init__(self, policy=None, out=CONSOLE, chunk_size=64, radius=1, spill_dir=None,
+                 generator="prim", fill_ratio=0.5, seed=None):
+        self.chunk_size = chunk_size
+        self.radius = radius
+        self.spill_dir = spill_dir
+        self.world = None
+        super().__init__(WORLD_SIZE, WORLD_SIZE, policy, out, generator, fill_ratio, seed=seed)
+
+    def new_rooms(self):
+        if self.world is not None:
+            self.world.close()
+        self.world = ChunkedWorld(self, self.chunk_size, self.radius, spill_dir=self.spill_dir)
+        return ChunkedRooms(self.world)
+
+    def new_room_names(self, floor=1):
+        return ChunkedNames(self.world, self.seed, floor)
+
+    def generate_dungeon(self, floor=1):
+        self.entities = SpatialIndex()
+        self.rooms = self.new_rooms()
+        self.room_names = self.new_room_names(floor)
+        self.visited_rooms = ChunkedVisited(self.world)
+        self.exit_coords = None
+        if self.player is None:
+            self.player = Player(self.policy.choose("name", "Enter your name: ", self), self.out, self.rng.combat)
+        start = (self.world.origin * self.chunk_size + self.chunk_size // 2,) * 2
+        self.world.center_on(*start)
+        self.rooms[start[1]][start[0]] = self.player
+        self.player.x, self.player.y = start
+        self.visited_rooms.add(start)
+
+    def run(self, max_turns=None):
+        try:
+            return (yield from super().run(max_turns))
+        finally:
+            self.world.close()  # the spilled chunks go with the game
+
+    def handle_room(self, x, y):
+        yield from super().handle_room(x, y)
+        self.world.center_on(self.player.x, self.player.y)
+
+# --- Map Files ---
+
+# A pregenerated floor on disk: a header, the grid as one ROOM_CODES byte per cell from
+# MAP_GRID_OFFSET on, then a pickle of the cell objects and the exit. MappedDungeon maps
+# the grid copy-on-write: opening a floor reads only the header and the object table,
+# the OS pages rows in as the player reaches them, and cleared cells never reach the file.
+MAP_MAGIC = b"MZ3M"
+MAP_VERSION = 1
+MAP_HEADER = struct.Struct("<4sHIIQQQ")  # magic, version, width, height, seed, start cell, table length
+MAP_GRID_OFFSET = mmap.ALLOCATIONGRANULARITY  # mmap offsets must be a multiple of this
+
+class MappedRooms(CompactRooms):
+    def __init__(self, path, width, height):
+        self.width = width
+        self.height = height
+        with open(path, "rb") as file:
+            self.codes = mmap.mmap(file.fileno(), width * height, access=mmap.ACCESS_COPY, offset=MAP_GRID_OFFSET)
+        self.entities = {}
+
+    def close(self):
+        self.codes.close()
+
+def write_map_file(game, path):
+    # Writes the floor game has just generated. The player is left out; MappedDungeon puts
+    # it back on the start cell.
+    codes, entities = grid_codes(game)
+    player = game.player
+    start = player.y * game.width + player.x
+    entities = {i: room for i, room in entities.items() if room is not player}
+    table = pickle.dumps({"entities": entities, "exit_coords": game.exit_coords}, protocol=pickle.HIGHEST_PROTOCOL)
+    with open(path, "wb") as file:
+        file.write(MAP_HEADER.pack(MAP_MAGIC, MAP_VERSION, game.width, game.height, game.seed, start, len(table)))
+        file.seek(MAP_GRID_OFFSET)
+        file.write(codes)
+        file.write(table)
+        file.seek(MAP_GRID_OFFSET + start)
+        file.write(bytes([ROOM_CODE_OF[None]]))
+
+def read_map_header(path):
+    with open(path, "rb") as file:
+        magic, version, width, height, seed, start, table = MAP_HEADER.unpack(file.read(MAP_HEADER.size))
+    if magic != MAP_MAGIC:
+        raise ValueError(f"{path} is not a maze map file")
+    if version != MAP_VERSION:
+        raise ValueError(f"{path} is map version {version}; this game reads version {MAP_VERSION}")
+    return width, height, seed, start, table
+
+def pregenerate_floor(path, width, height, floor=1, seed=None, generator="binary_tree", fill_ratio=0.5):
+    game = DungeonBase(width, height, policy=Policy(), out=NullOutput(), generator=generator,
+                       fill_ratio=fill_ratio, compact=True, seed=seed)
+    game.generate_dungeon(floor)
+    write_map_file(game, path)
+
+class MappedDungeon(DungeonBase):
+    # Plays pregenerated floors from map files, one path per floor, all the same size.
+    # Floors past the last file are generated as usual, in compact mode.
+    def __init__(self, paths, policy=None, out=CONSOLE, generator="prim", fill_ratio=0.5, seed=None):
+        self.paths = list(paths)
+        self.headers = [read_map_header(path) for path in self.paths]
+        width, height = self.headers[0][:2]
+        if any(header[:2] != (width, height) for header in self.headers):
+            raise ValueError("every map file of a MappedDungeon must have the same size")
+        self.rooms = None
+        self.mapped_floor = 1
+        super().__init__(width, height, policy, out, generator, fill_ratio, compact=True,
+                         seed=seed if seed is not None else self.headers[0][2])
+
+    def new_rooms(self):
+        if isinstance(self.rooms, MappedRooms):
+            self.rooms.close()
+        if self.mapped_floor is None:
+            return CompactRooms(self.width, self.height)
+        return MappedRooms(self.paths[self.mapped_floor - 1], self.width, self.height)
+
+    def new_room_names(self, floor=1):
+        if self.mapped_floor is None:
+            return super().new_room_names(floor)
+        return RoomNames(self.width, self.height, self.headers[self.mapped_floor - 1][2], floor)
+
+    def generate_dungeon(self, floor=1):
+        if floor > len(self.paths):
+            self.mapped_floor = None
+            return super().generate_dungeon(floor)
+        self.mapped_floor = floor
+        self.rooms = self.new_rooms()
+        self.room_names = self.new_room_names(floor)
+        path = self.paths[floor - 1]
+        _, _, _, start, size = self.headers[floor - 1]
+        with open(path, "rb") as file:
+            file.seek(MAP_GRID_OFFSET + self.width * self.height)
+            table = pickle.loads(file.read(size))
+        self.rooms.entities.update(table["entities"])
+        self.exit_coords = table["exit_coords"]
+        self.entities = SpatialIndex()
+        for i, room in table["entities"].items():
+            self.entities.add(room, (i % self.width, i // self.width))
+
+        if self.player is None:
+            self.player = Player(self.policy.choose("name", "Enter your name: ", self), self.out, self.rng.combat)
+        x, y = start % self.width, start // self.width
+        self.rooms[y][x] = self.player
+        self.player.x, self.player.y = x, y
+        self.visited_rooms.add((x, y))
+
+# --- Minimap ---
+
+MINIMAP_SYMBOLS = {"Empty": ".", "Exit": "X", "Trap": "^", "Treasure": "$", "Enchantment": "*", "Blacksmith": "B"}
+
+class Minimap:
+    # A fog-of-war map drawn with ANSI cursor moves. It remembers what is on screen and
+    # each frame rewrites only the cells that changed around the player's old and new
+    # cells, in one write, so a frame costs the same on a 10x10 floor as on a huge one.
+    # A cell shows once the player has stood on or next to it; cells the player walked
+    # through (now closed) show as ",". Big floors scroll a width x height window.
+    def __init__(self, game, stream=None, width=40, height=20, top=1):
+        self.game = game
+        self.stream = stream or sys.stdout
+        self.width = width
+        self.height = height
+        self.top = top  # screen row of the map's first line
+        self.rooms = None  # the floor on screen
+        self.origin = None  # floor cell at the window's top-left corner
+        self.screen = {}  # (column, row) -> character on screen
+        self.seen = set()
+        self.last = None  # player cell at the last frame
+        self.status = None
+        self.cleared = False
+
+    def symbol(self, x, y):
+        if (x, y) not in self.seen:
+            return " "
+        room = self.game.rooms[y][x]
+        if room is self.game.player:
+            return "@"
+        if room is None:
+            return "," if (x, y) in self.game.visited_rooms else "#"
+        if isinstance(room, Enemy):
+            return "E"
+        if isinstance(room, Item):
+            return "k" if room.name == "Key" else "i"
+        return MINIMAP_SYMBOLS.get(room, "?")
+
+    def frame(self):
+        game, player = self.game, self.game.player
+        px, py = player.x, player.y
+        view_w, view_h = min(self.width, game.width), min(self.height, game.height)
+        if game.rooms is not self.rooms:
+            self.rooms = game.rooms
+            self.seen = set()
+            self.origin = None
+            self.last = None
+        dirty = set()
+        if self.last is not None:
+            dirty.add(self.last)
+        for x, y in ((px, py), (px - 1, py), (px + 1, py), (px, py - 1), (px, py + 1)):
+            if 0 <= x < game.width and 0 <= y < game.height:
+                self.seen.add((x, y))
+                dirty.add((x, y))
+        self.last = (px, py)
+
+        # Recentre when the player gets within a quarter window of the edge.
+        ox, oy = self.origin or (0, 0)
+        if (self.origin is None or not view_w // 4 <= px - ox < view_w - view_w // 4
+                or not view_h // 4 <= py - oy < view_h - view_h // 4):
+            ox = min(max(0, px - view_w // 2), game.width - view_w)
+            oy = min(max(0, py - view_h // 2), game.height - view_h)
+            if (ox, oy) != self.origin:
+                self.origin = (ox, oy)
+                dirty = {(ox + c, oy + r) for r in range(view_h) for c in range(view_w)}
+
+        parts = []
+        if not self.cleared:
+            parts.append("\x1b[2J")
+            self.cleared = True
+        top = self.top
+        for x, y in dirty:
+            column, row = x - ox, y - oy
+            if 0 <= column < view_w and 0 <= row < view_h:
+                ch = self.symbol(x, y)
+                if self.screen.get((column, row)) != ch:
+                    self.screen[(column, row)] = ch
+                    parts.append(f"\x1b[{top + row};{column + 1}H{ch}")
+        status = f"Floor {game.floor}  HP {player.health}/{player.max_health}  Gold {player.gold}  Turn {game.turns}"
+        if status != self.status:
+            self.status = status
+            parts.append(f"\x1b[{top + view_h};1H\x1b[K{status}")
+        if parts:
+            parts.append(f"\x1b[{top + view_h + 1};1H")
+        return "".join(parts)
+
+    def draw(self):
+        update = self.frame()
+        if update:
+            self.stream.write(update)
+            self.stream.flush()
+
+# --- Headless Simulation ---
+
+def simulate_run(policy, width=10, height=10, max_turns=2000, record=True, seed=None):
+    # Plays one full game with no terminal I/O and returns its summary, plus the
+    # event records when record is set. A seed and a seeded policy replay it exactly.
+    out = EventRecorder() if record else NullOutput()
+    game = DungeonBase(width, height, policy=policy, out=out, seed=seed)
+    game.play_game(max_turns=max_turns)
+    result = game.summary()
+    if record:
+        result["events"] = out.events
+    return result
+
+# --- Replays ---
+
+# A replay is a run as a JSON object: the game's settings and seed, every (site, answer)
+# its prompts got, and the summary it ended with. Replay files hold one per line, so a
+# corpus of real runs can be replayed against a changed game to see which ones play out
+# differently. Bump REPLAY_VERSION whenever the layout changes.
+REPLAY_VERSION = 1
+
+class RecordingPolicy(Policy):
+    # Passes every prompt on to policy and logs the (site, answer) it gets back.
+    def __init__(self, policy):
+        self.policy = policy
+        self.choices = []
+
+    def choose(self, site, prompt, game, **context):
+        answer = self.policy.choose(site, prompt, game, **context)
+        self.choices.append((site, answer))
+        return answer
+
+def make_replay(game, choices):
+    # The game's choices must start from its first prompt; a resumed save cannot be replayed.
+    return {
+        "version": REPLAY_VERSION, "width": game.width, "height": game.height, "generator": game.generator,
+        "fill_ratio": game.fill_ratio, "compact": game.compact, "validate": game.validate, "seed": game.seed,
+        "choices": [list(choice) for choice in choices], "summary": game.summary(),
+    }
+
+def append_replay(path, replay):
+    with open(path, "a", encoding="utf-8") as file:
+        file.write(json.dumps(replay, ensure_ascii=False) + "\n")
+
+def read_replays(path):
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            if line.strip():
+                replay = json.loads(line)
+                if replay["version"] != REPLAY_VERSION:
+                    raise ValueError(f"unsupported replay version {replay['version']} (this game reads version {REPLAY_VERSION})")
+                yield replay
+
+class Replayer:
+    # Re-executes a replay headlessly at full speed. seek() stops at the start of any turn
+    # (turns count from 1) to inspect the game there; going back means a new Replayer.
+    # diverged is the index of the first recorded choice the game did not ask for in the
+    # same place, or None while the game keeps to the recording.
+    def __init__(self, replay, out=None):
+        self.choices = replay["choices"]
+        self.game = DungeonBase(replay["width"], replay["height"], Policy(), out or NullOutput(), replay["generator"],
+                                replay["fill_ratio"], replay["compact"], replay["seed"], replay["validate"])
+        self.steps = self.game.run()
+        self.position = 0
+        self.diverged = None
+        self.request = next(self.steps)
+
+    def step(self):
+        # Answers the pending prompt from the recording; False once the run is over.
+        if self.request is None:
+            return False
+        if self.position == len(self.choices):
+            self.request = None  # the recording stops here: the player left mid-game
+            return False
+        if self.choices[self.position][0] != self.request[0]:
+            self.diverged = self.position
+            self.request = None
+            return False
+        answer = self.choices[self.position][1]
+        self.position += 1
+        try:
+            self.request = self.steps.send(answer)
+        except StopIteration:
+            self.request = None
+            if self.position < len(self.choices):
+                self.diverged = self.position
+        return self.request is not None
+
+    def seek(self, turn):
+        while self.request is not None and not (self.request[0] == "action" and self.game.turns >= turn):
+            self.step()
+        self.game.out.flush()
+        return self.game
+
+    def finish(self):
+        while self.step():
+            pass
+        self.game.out.flush()
+        return self.game
+
+def check_replays(replays):
+    # Replays each run to the end. Returns ({"same", "changed", "diverged": count}, [(index, status), ...]
+    # for the runs that are not the same): "changed" runs asked for every recorded choice but
+    # ended with a different summary, "diverged" ones stopped following the recording.
+    counts, differences = Counter(), []
+    for index, replay in enumerate(replays):
+        replayer = Replayer(replay)
+        game = replayer.finish()
+        if replayer.diverged is not None:
+            status = "diverged"
+        elif json.loads(json.dumps(game.summary())) != replay["summary"]:
+            status = "changed"
+        else:
+            status = "same"
+        counts[status] += 1
+        if status != "same":
+            differences.append((index, status))
+    return counts, differences
+
+# --- Monte Carlo Runner ---
+
+def new_report():
+    return {
+        "runs": 0,
+        "outcomes": Counter(),
+        "death_causes": Counter(),
+        "reached": Counter(),   # runs that entered each floor
+        "cleared": Counter(),   # runs that went on to the next floor (or finished the dungeon)
+        "gold": Counter(),      # summed gold on entering each floor
+        "xp": Counter(),        # summed total XP on entering each floor
+        "level": Counter(),     # summed level on entering each floor
+    }
+
+def add_run(report, result):
+    report["runs"] += 1
+    report["outcomes"][result["outcome"]] += 1
+    if result["death_cause"]:
+        report["death_causes"][result["death_cause"]] += 1
+    floors = result["floors"]
+    for i, (floor, gold, xp, level, _) in enumerate(floors):
+        report["reached"][floor] += 1
+        report["gold"][floor] += gold
+        report["xp"][floor] += xp
+        report["level"][floor] += level
+        if i + 1 < len(floors) or result["outcome"] == "completed":
+            report["cleared"][floor] += 1
+
+def merge_reports(total, part):
+    total["runs"] += part["runs"]
+    for key, value in part.items():
+        if isinstance(value, Counter):
+            total[key].update(value)
+    return total
+
+def simulate_chunk(job):
+    # Worker entry point: plays a contiguous block of seeds and returns one partial report.
+    first_seed, count, width, height, max_turns, policy_class = job
+    report = new_report()
+    for seed in range(first_seed, first_seed + count):
+        add_run(report, simulate_run(policy_class(seed), width, height, max_turns, record=False, seed=seed))
+    return report
+
+def run_monte_carlo(runs, workers=None, seed=0, width=10, height=10, max_turns=2000,
+                    policy_class=GreedyPolicy, chunk_size=None):
+    # Run i always uses seed + i, so a report only depends on (runs, seed), never on the worker count.
+    workers = workers or os.cpu_count() or 1
+    chunk_size = chunk_size or max(1, min(1000, runs // (workers * 4)))
+    jobs = [(seed + start, min(chunk_size, runs - start), width, height, max_turns, policy_class)
+            for start in range(0, runs, chunk_size)]
+    report = new_report()
+    if workers == 1:
+        for job in jobs:
+            merge_reports(report, simulate_chunk(job))
+        return report
+    with multiprocessing.Pool(workers) as pool:
+        for part in pool.imap_unordered(simulate_chunk, jobs):
+            merge_reports(report, part)
+    return report
+
+def by_count(counter):
+    # Most common first, ties by name. most_common() breaks ties by insertion order, which
+    # depends on the order imap_unordered hands back the workers' partial reports.
+    return sorted(counter.items(), key=lambda item: (-item[1], item[0]))
+
+def format_report(report):
+    runs = report["runs"]
+    lines = [f"Runs: {runs}", "Outcomes: " + ", ".join(f"{k} {v}" for k, v in by_count(report["outcomes"]))]
+    lines.append("Floor  Reached  Survival  Avg Gold  Avg XP  Avg Level")
+    for floor in range(1, MAX_FLOOR + 1):
+        reached = report["reached"][floor]
+        if not reached:
+            break
+        survival = report["cleared"][floor] / reached
+        lines.append(f"{floor:>5}  {reached:>7}  {survival:>8.1%}  {report['gold'][floor] / reached:>8.1f}"
+                     f"  {report['xp'][floor] / reached:>6.1f}  {report['level'][floor] / reached:>9.2f}")
+    lines.append("Death causes:")
+    for cause, count in by_count(report["death_causes"]):
+        lines.append(f"  {cause}: {count} ({count / runs:.1%})")
+    return "\n".join(lines)
+
+# --- Batched Combat ---
+
+# Ability codes used by the array kernels; index 0 is "no ability".
+ABILITY_CODES = {None: 0, "lifesteal": 1, "poison": 2, "burn": 3, "freeze": 4, "double_strike": 5}
+
+def resolve_duels(player_health, damage_min, damage_max, enemy_health, enemy_attack, enemy_ability,
+                  poison=0, burn=0, freeze=0, rng=None, max_rounds=10000):
+    # Resolves many independent battle() calls at once for a player who always attacks.
+    # Mirrors the scalar rules exactly: status effects tick once when the battle starts,
+    # a still-frozen player skips the fight and takes one hit, and each round the player
+    # strikes first and the enemy answers with Enemy.attack. Enemy defense and enemy
+    # status effects are not read by the scalar rules, so they are not inputs here.
+    if np is None:
+        raise ImportError("resolve_duels needs NumPy (pip install numpy)")
+    rng = rng if rng is not None else np.random.default_rng()
+    player_health = np.array(player_health, dtype=np.int64)
+    n = player_health.shape[0]
+    damage_min = np.broadcast_to(np.asarray(damage_min, dtype=np.int64), (n,))
+    damage_max = np.broadcast_to(np.asarray(damage_max, dtype=np.int64), (n,))
+    enemy_health = np.array(np.broadcast_to(enemy_health, (n,)), dtype=np.int64)
+    enemy_attack = np.broadcast_to(np.asarray(enemy_attack, dtype=np.int64), (n,))
+    enemy_ability = np.broadcast_to(np.asarray(enemy_ability, dtype=np.int8), (n,))
+    poison = np.array(np.broadcast_to(poison, (n,)), dtype=np.int64)
+    burn = np.array(np.broadcast_to(burn, (n,)), dtype=np.int64)
+    freeze = np.array(np.broadcast_to(freeze, (n,)), dtype=np.int64)
+    rounds = np.zeros(n, dtype=np.int64)
+
+    def enemy_strikes(idx):
+        damage = rng.integers(enemy_attack[idx] // 2, enemy_attack[idx] + 1)
+        ability = enemy_ability[idx]
+        lifesteal = ability == 1
+        enemy_health[idx[lifesteal]] += damage[lifesteal] // 3
+        poison[idx[ability == 2]] = 3
+        burn[idx[ability == 3]] = 3
+        freeze[idx[ability == 4]] = 1
+        hits = 1 + ((ability == 5) & (rng.random(idx.shape[0]) < 0.25))
+        player_health[idx] = np.maximum(0, player_health[idx] - damage * hits)
+
+    # apply_status_effects: one tick of each effect at the start of the battle
+    ticking = poison > 0
+    player_health[ticking] -= 3
+    poison[ticking] -= 1
+    ticking = burn > 0
+    player_health[ticking] -= 4
+    burn[ticking] -= 1
+    freeze[freeze > 0] -= 1
+
+    # A player still frozen loses the whole battle turn and the fight stays unresolved.
+    frozen = freeze > 0
+    skipped = np.flatnonzero(frozen)
+    freeze[skipped] -= 1
+    enemy_strikes(skipped[enemy_health[skipped] > 0])
+
+    active = np.flatnonzero(~frozen & (player_health > 0) & (enemy_health > 0))
+    while active.size and max_rounds:
+        max_rounds -= 1
+        rounds[active] += 1
+        damage = rng.integers(damage_min[active], damage_max[active] + 1)
+        enemy_health[active] = np.maximum(0, enemy_health[active] - damage)
+        enemy_strikes(active[enemy_health[active] > 0])
+        active = active[(player_health[active] > 0) & (enemy_health[active] > 0)]
+
+    return {
+        "won": enemy_health <= 0,
+        "player_health": player_health,
+        "enemy_health": enemy_health,
+        "rounds": rounds,
+        "poison": poison,
+        "burn": burn,
+        "freeze": freeze,
+    }
+
+def duel_arrays(player, enemies):
+    # Builds resolve_duels() inputs for one player against a list of Enemy objects.
+    if player.weapon:
+        low, high = player.weapon.min_damage, player.weapon.max_damage
+    else:
+        low, high = player.attack_power // 2, player.attack_power
+    n = len(enemies)
+    return {
+        "player_health": np.full(n, player.health, dtype=np.int64),
+        "damage_min": low,
+        "damage_max": high,
+        "enemy_health": np.array([e.health for e in enemies], dtype=np.int64),
+        "enemy_attack": np.array([e.attack_power for e in enemies], dtype=np.int64),
+        "enemy_ability": np.array([ABILITY_CODES[e.ability] for e in enemies], dtype=np.int8),
+        "poison": player.status_effects.get("poison", 0),
+        "burn": player.status_effects.get("burn", 0),
+        "freeze": player.status_effects.get("freeze", 0),
+    }
+
+def floor_enemy_pool(floor, dungeons=200, width=10, height=10, seed=None):
+    # Every enemy (regulars and the boss) that generate_dungeon placed over a number of floors.
+    game = DungeonBase(width, height, policy=Policy(), out=NullOutput(), seed=seed)
+    pool = []
+    for _ in range(dungeons):
+        game.generate_dungeon(floor)
+        pool.extend(room for row in game.rooms for room in row if isinstance(room, Enemy))
+    return pool
+
+def win_probabilities(floors=range(1, MAX_FLOOR + 1), weapons=None, levels=range(1, 11), samples=10000, seed=0):
+    # Chance that a fresh player of each level and weapon beats a random enemy of each floor.
+    # Returns {(floor, weapon name or None, level): probability}.
+    rng = np.random.default_rng(seed)
+    if weapons is None:
+        weapons = [None] + shop_weapons()
+    table = {}
+    for floor in floors:
+        pool = floor_enemy_pool(floor, seed=seed)
+        picks = rng.integers(0, len(pool), samples)
+        enemies = [pool[i] for i in picks]
+        for weapon in weapons:
+            for level in levels:
+                player = Player("Bot", NullOutput())
+                for _ in range(level - 1):
+                    player.level_up()
+                player.weapon = weapon
+                result = resolve_duels(rng=rng, **duel_arrays(player, enemies))
+                table[(floor, weapon.name if weapon else None, level)] = float(result["won"].mean())
+    return table
+
+# --- Exact Fight Oracle ---
+
+def fight_distribution(player_health, damage_min, damage_max, enemy_health, enemy_attack, ability=None,
+                       poison=0, burn=0, freeze=0):
+    # Exact outcome of one battle() for a player who always attacks. enemy_health is an int or an
+    # inclusive (low, high) range that is drawn uniformly, as generate_dungeon does. Returns
+    # {"win", "loss", "skipped"} probabilities, "hp" as ((final player health, probability), ...)
+    # and "effects" as (((poison, burn, freeze), probability), ...) left on the player afterwards.
+    if isinstance(enemy_health, int):
+        enemy_health = (enemy_health, enemy_health)
+    return dict(_solve_fight(player_health, damage_min, damage_max, enemy_health[0], enemy_health[1],
+                             enemy_attack, ability, poison, burn, freeze))
+
+def _enemy_strikes(attack, ability):
+    # (player damage, enemy heal, probability) for one Enemy.attack, duplicates merged
+    low, high = attack // 2, attack
+    chance = 1 / (high - low + 1)
+    strikes = Counter()
+    for damage in range(low, high + 1):
+        if ability == "lifesteal":
+            strikes[(damage, damage // 3)] += chance
+        elif ability == "double_strike":
+            strikes[(damage, 0)] += chance * 0.75
+            strikes[(damage * 2, 0)] += chance * 0.25
+        else:
+            strikes[(damage, 0)] += chance
+    return [(damage, heal, q) for (damage, heal), q in strikes.items()]
+
+@lru_cache(maxsize=4096)
+def _solve_fight(player_health, damage_min, damage_max, enemy_low, enemy_high, enemy_attack, ability,
+                 poison, burn, freeze):
+    if damage_min <= 0 and enemy_attack // 2 <= 0:
+        raise ValueError("a fight where neither side is guaranteed damage may never end")
+    strikes = _enemy_strikes(enemy_attack, ability)
+    hit_chance = 1 / (damage_max - damage_min + 1)
+    hits = range(damage_min, damage_max + 1)
+    outcome = Counter()
+    hp = Counter()
+    struck = 0.0
+
+    # apply_status_effects ticks once when the battle starts
+    p = player_health
+    if poison > 0:
+        p -= 3
+        poison -= 1
+    if burn > 0:
+        p -= 4
+        burn -= 1
+    if freeze > 0:
+        freeze -= 1
+    start_chance = 1 / (enemy_high - enemy_low + 1)
+
+    if freeze > 0:
+        # Still frozen: battle() gives the enemy one free attack and ends unresolved.
+        freeze -= 1
+        struck = 1.0
+        for damage, _, q in strikes:
+            left = max(0, p - damage)
+            outcome["skipped" if left > 0 else "loss"] += q
+            hp[left] += q
+    elif p <= 0:
+        outcome["loss"] = 1.0
+        hp[p] = 1.0
+    else:
+        # Forward DP over (player hp, enemy hp, enemy has struck). Player hp never rises inside a
+        # fight, so layers are finished from the top down; within a layer enemy hp only falls.
+        # "a" holds fights waiting for the player's swing, "b" fights waiting for the enemy's.
+        pending = {p: {(e, 0): start_chance for e in range(enemy_low, enemy_high + 1)}}
+        enemy_first = damage_min > 0
+        for layer in range(p, 0, -1):
+            states = pending.pop(layer, None)
+            if not states:
+                continue
+            top = max(e for e, _ in states)
+            a = [[0.0, 0.0] for _ in range(top + 1)]
+            b = [[0.0, 0.0] for _ in range(top + 1)]
+            for (e, s), mass in states.items():
+                a[e][s] += mass
+            for e in range(top, 0, -1):
+                for phase in ("b", "a") if enemy_first else ("a", "b"):
+                    if phase == "a":
+                        for s in (0, 1):
+                            mass = a[e][s] * hit_chance
+                            if not mass:
+                                continue
+                            for hit in hits:
+                                if hit >= e:
+                                    outcome["win"] += mass
+                                    hp[layer] += mass
+                                    struck += mass * s
+                                else:
+                                    b[e - hit][s] += mass
+                    else:
+                        mass = b[e][0] + b[e][1]
+                        if not mass:
+                            continue
+                        for damage, heal, q in strikes:
+                            left = layer - damage
+                            if left <= 0:
+                                outcome["loss"] += mass * q
+                                hp[0] += mass * q
+                                struck += mass * q
+                            elif left == layer:
+                                a[e][1] += mass * q
+                            else:
+                                target = pending.setdefault(left, {})
+                                target[(e + heal, 1)] = target.get((e + heal, 1), 0.0) + mass * q
+
+    base = (poison, burn, freeze)
+    hit_effects = {"poison": (3, burn, freeze), "burn": (poison, 3, freeze), "freeze": (poison, burn, 1)}.get(ability, base)
+    effects = Counter({base: 1.0 - struck})
+    effects[hit_effects] += struck
+    return (
+        ("win", outcome["win"]),
+        ("loss", outcome["loss"]),
+        ("skipped", outcome["skipped"]),
+        ("hp", tuple(sorted(hp.items()))),
+        ("effects", tuple((key, q) for key, q in effects.items() if q > 1e-12)),
+    )
+
+def shop_weapons():
+    return [item for item in DungeonBase(1, 1, out=NullOutput()).shop_items if isinstance(item, Weapon)]
+
+def matchup_odds(level, weapon_name, enemy_name, floor):
+    # Chance that a fresh player of this level, wielding this shop weapon (None for bare hands),
+    # beats the named regular enemy with the stat scaling generate_dungeon applies on that floor.
+    player = Player("Bot", NullOutput())
+    for _ in range(level - 1):
+        player.level_up()
+    if weapon_name is None:
+        low, high = player.attack_power // 2, player.attack_power
+    else:
+        weapon = next(w for w in shop_weapons() if w.name == weapon_name)
+        low, high = weapon.min_damage, weapon.max_damage
+    name, hp_min, hp_max, atk_min, atk_max, _ = next(t for t in ENEMY_TYPES if t[0] == enemy_name)
+    scale = 1 if floor <= 3 else 2
+    attacks = range(atk_min + scale, atk_max + scale + 1)
+    win = 0.0
+    for attack in attacks:
+        result = fight_distribution(player.health, low, high, (hp_min + floor * scale, hp_max + floor * scale),
+                                    attack, SPECIAL_ABILITIES.get(name))
+        win += result["win"] / len(attacks)
+    return win
+
+# --- Game Server ---
+
+class SocketStream:
+    # Where a session's ConsoleOutput writes; the server drains the connection at each prompt.
+    def __init__(self, writer):
+        self.writer = writer
+
+    def write(self, text):
+        self.writer.write(text.encode())
+
+    def flush(self):
+        pass
+
+class GameSession:
+    # One player's game, suspended in run() at the prompt it is waiting on. Games are
+    # seeded and every (site, answer) is logged, so hibernate() can drop the game and
+    # wake() rebuild it exactly by replaying the answers against the same seed.
+    def __init__(self, game):
+        self.game = game
+        self.out = game.out
+        self.width, self.height, self.seed = game.width, game.height, game.seed
+        self.steps = game.run()
+        self.site = self.prompt = None
+        self.choices = []
+        self.packed = None  # the choice log, compressed, while hibernating in memory
+        self.path = None  # or the file holding it
+        self.last_active = time.monotonic()
+
+    def send(self, answer=None):
+        # Plays on to the next prompt and returns its text, or None once the game is over.
+        self.last_active = time.monotonic()
+        if self.game is None:
+            self.wake()
+        if answer is not None:
+            self.choices.append((self.site, answer))
+        try:
+            self.site, self.prompt, context = self.steps.send(answer)
+        except StopIteration:
+            self.game.out.flush()
+            self.site = self.prompt = None
+        return self.prompt
+
+    def hibernate(self, path=None):
+        # Frees the game, keeping only its choice log: in memory, or in the file at path.
+        self.steps.close()
+        packed = zlib.compress("".join(f"\n{site}\t{answer}" for site, answer in self.choices).encode())
+        if path:
+            with open(path, "wb") as file:
+                file.write(packed)
+            self.path = path
+        else:
+            self.packed = packed
+        self.game = self.steps = self.choices = None
+
+    def logged_choices(self):
+        if self.choices is not None:
+            return self.choices
+        if self.path:
+            with open(self.path, "rb") as file:
+                packed = file.read()
+        else:
+            packed = self.packed
+        lines = zlib.decompress(packed).decode().split("\n")[1:]
+        return [tuple(line.split("\t", 1)) for line in lines]
+
+    def wake(self):
+        # Replays the log silently; the rebuilt game stops at the prompt the player is answering.
+        self.choices = self.logged_choices()
+        if self.path:
+            os.unlink(self.path)
+        self.packed = self.path = None
+        self.game = DungeonBase(self.width, self.height, out=NullOutput(), seed=self.seed)
+        self.steps = self.game.run()
+        try:
+            self.site, self.prompt, context = self.steps.send(None)
+            for site, answer in self.choices:
+                self.site, self.prompt, context = self.steps.send(answer)
+        except StopIteration:
+            self.site = self.prompt = None  # the game had already finished
+        self.game.out = self.out
+        if self.game.player:
+            self.game.player.out = self.out
+
+    def replay(self):
+        # The run as a replay, made from the choice log: a hibernating session is replayed
+        # headlessly rather than woken.
+        if self.game is not None:
+            return make_replay(self.game, self.choices)
+        replay = make_replay(DungeonBase(self.width, self.height, Policy(), NullOutput(), seed=self.seed),
+                             self.logged_choices())
+        replay["summary"] = Replayer(replay).finish().summary()
+        return replay
+
+    def close(self):
+        if self.steps:
+            self.steps.close()
+        if self.path:
+            os.unlink(self.path)
+
+class GameServer:
+    # Hosts any number of games in one event loop, one session per connection. A session
+    # between commands is a suspended generator, so an idle player costs its game state
+    # and no thread. At most max_resident games stay in memory (least recently active
+    # hibernate first), and so does none idle for idle_after seconds; spill_dir moves
+    # hibernating sessions to disk. With record set, every run ends up in that replay file.
+    # Speaks plain lines, so telnet, nc or --connect can play.
+    def __init__(self, width=10, height=10, seed=None, max_resident=1000, idle_after=300.0, spill_dir=None,
+                 record=None):
+        self.width = width
+        self.height = height
+        self.seed = seed  # with a seed, session n plays seed + n
+        self.max_resident = max_resident
+        self.idle_after = idle_after
+        self.spill_dir = spill_dir
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+        self.record = record
+        self.sessions = {}
+        self.resident = OrderedDict()  # session id -> session with a live game, least recently active first
+        self.next_id = 1
+
+    def open_session(self, out):
+        session_id = self.next_id
+        self.next_id += 1
+        seed = None if self.seed is None else self.seed + session_id
+        self.sessions[session_id] = GameSession(DungeonBase(self.width, self.height, out=out, seed=seed))
+        return session_id
+
+    def answer(self, session_id, answer=None):
+        session = self.sessions[session_id]
+        self.resident[session_id] = session
+        self.resident.move_to_end(session_id)
+        prompt = session.send(answer)
+        if prompt is None:
+            del self.resident[session_id]  # finished: nothing left to hibernate for
+        while len(self.resident) > self.max_resident:
+            self.hibernate(next(iter(self.resident)))
+        return prompt
+
+    def hibernate(self, session_id):
+        # Finished and already hibernated sessions are not resident; there is nothing to do.
+        session = self.resident.pop(session_id, None)
+        if session is not None:
+            path = os.path.join(self.spill_dir, f"session-{session_id}.bin") if self.spill_dir else None
+            session.hibernate(path)
+
+    def close_session(self, session_id):
+        self.resident.pop(session_id, None)
+        session = self.sessions.pop(session_id)
+        try:
+            if self.record and session.logged_choices():
+                append_replay(self.record, session.replay())
+        finally:
+            session.close()
+
+    async def evict_idle(self):
+        while True:
+            await asyncio.sleep(self.idle_after / 4)
+            cutoff = time.monotonic() - self.idle_after
+            while self.resident:
+                session_id, session = next(iter(self.resident.items()))
+                if session.last_active > cutoff:
+                    break
+                self.hibernate(session_id)
+
+    async def handle(self, reader, writer):
+        session_id = self.open_session(ConsoleOutput(SocketStream(writer)))
+        try:
+            prompt = self.answer(session_id)
+            while prompt is not None:
+                writer.write(prompt.encode())
+                await writer.drain()
+                line = await reader.readline()
+                if not line:
+                    break  # the player hung up
+                prompt = self.answer(session_id, line.decode(errors="replace").rstrip("\r\n"))
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+            self.close_session(session_id)
+
+    async def serve(self, host="127.0.0.1", port=8023):
+        server = await asyncio.start_server(self.handle, host, port, backlog=1024)
+        evictor = asyncio.create_task(self.evict_idle()) if self.idle_after else None
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            if evictor:
+                evictor.cancel()
+
+async def play_remote(host="127.0.0.1", port=8023):
+    # A line client for GameServer: shows what the server sends and forwards what you type.
+    reader, writer = await asyncio.open_connection(host, port)
+    loop = asyncio.get_running_loop()
+    lines = asyncio.Queue()
+
+    def read_stdin():  # a daemon thread, so a pending readline never holds up exit
+        for line in sys.stdin:
+            loop.call_soon_threadsafe(lines.put_nowait, line)
+        loop.call_soon_threadsafe(lines.put_nowait, "")
+
+    async def forward():
+        while line := await lines.get():
+            writer.write(line.encode())
+            await writer.drain()
+        writer.write_eof()
+
+    threading.Thread(target=read_stdin, daemon=True).start()
+    typing = asyncio.create_task(forward())
+    decoder = codecs.getincrementaldecoder("utf-8")("replace")
+    while data := await reader.read(65536):
+        sys.stdout.write(decoder.decode(data))
+        sys.stdout.flush()
+    typing.cancel()
+    writer.close()
 
 if __name__ == "__main__":
-    game = DungeonBase(10, 10)
-    game.play_game()
+    parser = argparse.ArgumentParser(description="Maze 3.0 dungeon crawler")
+    parser.add_argument("--simulate", type=int, metavar="RUNS", help="play RUNS headless games with the greedy bot")
+    parser.add_argument("--workers", type=int, default=None, help="processes for --simulate (default: all cores)")
+    parser.add_argument("--seed", type=int, default=None, help="replay a game, or the first run of --simulate")
+    parser.add_argument("--save", metavar="PATH", help="save the game to PATH when you quit")
+    parser.add_argument("--load", metavar="PATH", help="resume a game saved with --save or --autosave")
+    parser.add_argument("--autosave", metavar="PATH", help="checkpoint to PATH every floor and journal every turn")
+    parser.add_argument("--watch", action="store_true", help="watch the pathfinding bot play on a live minimap")
+    parser.add_argument("--log", metavar="PATH", help="with --watch, write the game's events to PATH as JSON lines")
+    parser.add_argument("--serve", type=int, metavar="PORT", help="host games for many players over TCP on PORT")
+    parser.add_argument("--connect", type=int, metavar="PORT", help="play on a game server listening on PORT")
+    parser.add_argument("--host", default="127.0.0.1", help="address for --serve and --connect")
+    parser.add_argument("--max-resident", type=int, default=1000, help="with --serve, games kept in memory at once")
+    parser.add_argument("--idle", type=float, default=300.0, metavar="SECONDS",
+                        help="with --serve, hibernate games idle this long (0 to never)")
+    parser.add_argument("--spill", metavar="DIR", help="with --serve, hibernate games to files in DIR")
+    parser.add_argument("--record", metavar="PATH", help="append a replay of each new game to PATH")
+    parser.add_argument("--replay", metavar="PATH", help="replay the runs in PATH and report any that play out differently")
+    parser.add_argument("--turn", type=int, help="with --replay, show the first run up to the start of this turn")
+    parser.add_argument("--width", type=int, default=10)
+    parser.add_argument("--height", type=int, default=10)
+    args = parser.parse_args()
+    if args.record and args.load:
+        parser.error("--record needs a new game; a resumed save cannot be replayed")
+
+    if args.simulate:
+        print(format_report(run_monte_carlo(args.simulate, workers=args.workers, seed=args.seed or 0)))
+    elif args.serve:
+        server = GameServer(args.width, args.height, seed=args.seed, max_resident=args.max_resident,
+                            idle_after=args.idle, spill_dir=args.spill, record=args.record)
+        asyncio.run(server.serve(args.host, args.serve))
+    elif args.replay and args.turn:
+        game = Replayer(next(read_replays(args.replay)), out=CONSOLE).seek(args.turn)
+        print(f"--- replay stopped at turn {game.turns} ---")
+    elif args.replay:
+        counts, differences = check_replays(read_replays(args.replay))
+        print(", ".join(f"{status} {counts[status]}" for status in ("same", "changed", "diverged")))
+        for index, status in differences:
+            print(f"  run {index + 1}: {status}")
+    elif args.connect:
+        asyncio.run(play_remote(args.host, args.connect))
+    elif args.watch:
+        log = open(args.log, "w", encoding="utf-8") if args.log else None
+        out = JsonLinesOutput(log) if log else NullOutput()
+        game = DungeonBase(args.width, args.height, policy=PathPolicy(args.seed), out=out, seed=args.seed)
+        game.minimap = Minimap(game)
+        if args.record:
+            game.policy = RecordingPolicy(game.policy)
+        game.play_game(max_turns=100000)
+        if log:
+            log.close()
+        if args.record:
+            append_replay(args.record, make_replay(game, game.policy.choices))
+        print(f"{game.outcome} on floor {game.floor} after {game.turns} turns")
+    else:
+        game = recover_game(args.load) if args.load else DungeonBase(args.width, args.height, seed=args.seed)
+        game.save_path = args.save
+        if args.autosave:
+            game.journal = Journal(args.autosave)
+        if args.record:
+            game.policy = RecordingPolicy(game.policy)
+        try:
+            game.play_game()
+        finally:
+            if args.record:
+                append_replay(args.record, make_replay(game, game.policy.choices))
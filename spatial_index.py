@@ -0,0 +1,64 @@
+# Shared by the maze versions: objects bucketed by the (x, y) cell they stand on, so
+# "what is here" and "what is nearby" cost the same however many objects a floor holds.
+
+class SpatialIndex:
+    def __init__(self):
+        self.cells = {}  # (x, y) -> list of objects on that cell, in the order they were added
+        self.count = 0
+
+    def add(self, obj, cell):
+        self.cells.setdefault(cell, []).append(obj)
+        self.count += 1
+
+    def remove(self, obj, cell):
+        bucket = self.cells[cell]
+        for i, other in enumerate(bucket):
+            if other is obj:
+                del bucket[i]
+                break
+        else:
+            raise ValueError(f"{obj!r} is not indexed at {cell}")
+        if not bucket:
+            del self.cells[cell]
+        self.count -= 1
+
+    def move(self, obj, old, new):
+        self.remove(obj, old)
+        self.add(obj, new)
+
+    def at(self, cell):
+        # A copy, so callers can remove what they find while looping over it.
+        return tuple(self.cells.get(cell, ()))
+
+    def first(self, cell):
+        bucket = self.cells.get(cell)
+        return bucket[0] if bucket else None
+
+    def near(self, cell, radius=1):
+        # (object, cell) pairs within radius steps along both axes (a square window).
+        x, y = cell
+        if (2 * radius + 1) ** 2 > len(self.cells):
+            for (cx, cy), bucket in self.cells.items():
+                if abs(cx - x) <= radius and abs(cy - y) <= radius:
+                    for obj in bucket:
+                        yield obj, (cx, cy)
+            return
+        for cy in range(y - radius, y + radius + 1):
+            for cx in range(x - radius, x + radius + 1):
+                for obj in self.cells.get((cx, cy), ()):
+                    yield obj, (cx, cy)
+
+    def clear(self):
+        self.cells.clear()
+        self.count = 0
+
+    def __contains__(self, cell):
+        return cell in self.cells
+
+    def __iter__(self):
+        for cell, bucket in list(self.cells.items()):
+            for obj in tuple(bucket):
+                yield obj, cell
+
+    def __len__(self):
+        return self.count
@@ -0,0 +1,23 @@
+import importlib.util
+import os
+import sys
+
+# The game script has a dot in its name, so it is loaded from its path.
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)  # for spatial_index
+spec = importlib.util.spec_from_file_location("maze3_0", os.path.join(HERE, "maze3.0.py"))
+maze = importlib.util.module_from_spec(spec)
+sys.modules[spec.name] = maze  # so pickle can find the game's classes
+spec.loader.exec_module(maze)
+
+def test_save_keeps_validate(tmp_path):
+    game = maze.DungeonBase(10, 10, policy=maze.Policy(), out=maze.NullOutput(), seed=1, validate="walkable")
+    game.generate_dungeon(1)
+    path = str(tmp_path / "game.sav")
+    maze.save_game(game, path)
+    assert maze.load_game(path, out=maze.NullOutput()).validate == "walkable"
+
+def test_report_does_not_depend_on_workers():
+    one = maze.format_report(maze.run_monte_carlo(60, workers=1, seed=11, chunk_size=5))
+    three = maze.format_report(maze.run_monte_carlo(60, workers=3, seed=11, chunk_size=5))
+    assert one == three